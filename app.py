@@ -1,22 +1,28 @@
 import os
-from flask import Flask, jsonify
+import click
+from flask import Flask, jsonify, request
 from flask_migrate import Migrate
 from flask_restful import Api
 from marshmallow import ValidationError
-from flask_uploads import configure_uploads, patch_request_class
+from flask_uploads import configure_uploads
 from dotenv import load_dotenv
 from http import HTTPStatus
 
 from resources.bank import SupplierBankResource, ResellerBankResource
+from resources.cache import CacheStatsResource
 from resources.category import CategoryResource, CategoryListResource
 from resources.confirmation import SubAdminConfirmation, SubAminConfirmationByUser, ResellerConfirmation, ResellerConfirmationByUser
 from resources.gmail_login import GmailLoginResource, GmailAuthorizeResource
+from resources.image import ImageResizeResource, ImageBlobResource
 from resources.item import (
     SupplierItemResource, 
     SupplierItemListResource,
     ResellerItemResource,
     ResellerItemListResource,
+    CategoryItemListResource,
+    ItemSuggestResource,
     ItemImageUploadResource, 
+    ItemImageBatchUploadResource,
     ItemImageDeleteResource
 )
 from resources.order import (
@@ -29,7 +35,7 @@ from resources.order import (
     ResellerOrderListResource
 )
 
-from resources.payment import PaymentResource
+from resources.payment import PaymentResource, PaystackWebhookResource
 from resources.user import (
     SupplierRegister, 
     Supplier, 
@@ -46,12 +52,17 @@ from resources.user import (
 )
 
 from db import db
-from extension import ma, jwt, cache, limiter
+from extension import ma, jwt, cache, l1_cache, limiter
 from blacklist import BLACKLIST
 from default_config import DefaultConfig
 from oauth import oauth
 
+from libs.fastdump import output_json
 from libs.img_helper import IMAGE_SET
+from libs.reconciliation import reconcile_payments
+from libs.sweeper import OrderSweeper, sweep_expired_orders
+from libs.uploads import StreamingRequest, BATCH_ENDPOINT
+from models.idempotency import IdempotencyKeyModel
 
 
 app = Flask(__name__)
@@ -59,14 +70,17 @@ load_dotenv('.env', verbose=True)
 app.config.from_object(DefaultConfig)
 app.config.from_envvar('APPLICATION_SETTINGS')
 configure_uploads(app, IMAGE_SET)
-patch_request_class(app, 5 * 1024 * 1024)
+app.request_class = StreamingRequest
 db.init_app(app)
 jwt.init_app(app)
 ma.init_app(app)
 oauth.init_app(app)
 api = Api(app)
+if app.config.get('FAST_SERIALIZATION'):
+    api.representation('application/json')(output_json)
 migrate = Migrate(app, db)
 cache.init_app(app)
+l1_cache.init_app(app)
 limiter.init_app(app)
 
 # This method will check if a token is blacklisted, and will be called automatically when blacklist is enabled
@@ -130,8 +144,8 @@ with app.app_context():
     
 
 @limiter.request_filter
-    def ip_whitelist():
-        return request.remote_addr == '127.0.0.1'
+def ip_whitelist():
+    return request.remote_addr == '127.0.0.1'
     
 
 @app.before_first_request
@@ -140,10 +154,43 @@ def create_tables():
     db.create_all()
 
 
+"""
+Background jobs
+"""
+@app.cli.command("sweep-orders")
+def sweep_orders():
+    """Cancel expired unpaid orders and return their stock."""
+    click.echo(f"{sweep_expired_orders()} expired orders cancelled")
+
+@app.cli.command("purge-idempotency-keys")
+def purge_idempotency_keys():
+    """Delete stored Idempotency-Key responses that have expired."""
+    click.echo(f"{IdempotencyKeyModel.purge_expired()} expired idempotency keys purged")
+
+@app.cli.command("reconcile-payments")
+@click.option("--workers", default=8, help="Concurrent verification requests.")
+@click.option("--rate", default=10.0, help="Maximum verification requests per second.")
+@click.option("--limit", default=1000, help="Maximum payments to verify in this run.")
+def reconcile_payments_command(workers, rate, limit):
+    """Verify pending payments with Paystack and update their orders."""
+    summary = reconcile_payments(workers=workers, rate=rate, limit=limit)
+    for outcome in ("checked", "success", "failed", "pending", "error", "updated"):
+        click.echo(f"{outcome}: {summary[outcome]}")
+
+@app.cli.command("run-sweeper")
+@click.option("--interval", type=int, default=None, help="Seconds between sweeps, ORDER_SWEEP_INTERVAL by default.")
+def run_sweeper(interval):
+    """Keep sweeping expired orders and idempotency keys until stopped. Run exactly one."""
+    interval = interval or app.config["ORDER_SWEEP_INTERVAL"]
+    click.echo(f"sweeping every {interval} seconds")
+    OrderSweeper(app, interval).run() #in this process, not next to every web worker
+
+
 """
 private endpoint
 """
 api.add_resource(SupplierAddToSubAdmin, '/admin/add')
+api.add_resource(CacheStatsResource, '/admin/cache/stats')
 
 """
 Subadmin account resources
@@ -186,6 +233,7 @@ Category resources
 """
 api.add_resource(CategoryResource, '/category/<string:name>')
 api.add_resource(CategoryListResource, '/categories')
+api.add_resource(CategoryItemListResource, '/category/<string:name>/items')
 api.add_resource(RefreshToken, '/refresh_token')
 
 """
@@ -194,13 +242,17 @@ Supplier Item resources
 api.add_resource(SupplierItemResource, '/<string:supplier_id>/item/<string:name>')
 api.add_resource(SupplierItemListResource, '/<string:supplier_id>/items')
 api.add_resource(ItemImageUploadResource, '/<string:supplier_id>/item/upload/<string:name>')
+api.add_resource(ItemImageBatchUploadResource, '/<string:supplier_id>/item/upload/<string:name>/batch', endpoint=BATCH_ENDPOINT)
 api.add_resource(ItemImageDeleteResource, '/<string:supplier_id>/item/delete/<string:filename>')
+api.add_resource(ImageResizeResource, '/images/<string:supplier_id>/<string:item_id>/<string:name>')
+api.add_resource(ImageBlobResource, '/images/blobs/<string:name>')
 
 """
 Reseller Item resources
 """
 api.add_resource(ResellerItemResource, '/item/<string:name>')
 api.add_resource(ResellerItemListResource, '/items')
+api.add_resource(ItemSuggestResource, '/items/suggest')
 
 """
 Supplier order resource
@@ -222,6 +274,7 @@ api.add_resource(ResellerOrderListResource, '/orders')
 Payment Resource
 """
 api.add_resource(PaymentResource, '/payment')
+api.add_resource(PaystackWebhookResource, '/payment/webhook')
 
 if __name__ == "__main__":
     app.run(port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""
+Compares schema.dump with the compiled dumpers of libs.fastdump on item and order
+pages of 10, 100 and 1000 objects, and checks that both produce the same output.
+
+    python -m benchmarks.serializers [repeat]
+"""
+
+import sys
+import timeit
+from datetime import datetime
+from flask import Flask
+from uuid import uuid4
+
+from libs import fastdump
+from libs.keyset import KeysetPagination
+from models import bank, category, confirmation, payment, user #mapper relationships name these
+from models.item import ItemModel
+from models.order import OrderModel, ItemsInOrder
+from schemas.item import ItemPaginationSchema
+from schemas.order import OrderPaginationSchema
+
+SIZES = (10, 100, 1000)
+
+
+def make_items(count: int):
+    items = []
+    for n in range(count):
+        item = ItemModel(supplier_id=uuid4().hex, category_id=uuid4().hex, name=f"item {n}", 
+                         price=1000.5 + n, description="A description of the item " * 4)
+        item.quantity = n
+        item.created_at = item.updated_at = datetime.utcnow()
+        blob_name = "ab" * 32 + ".jpg"
+        item.image_names = [(f"{item.id}_1.jpg", None), (f"{item.id}_2.jpg", blob_name)] #a legacy file and a blob
+        item.rendition_names = item.image_names[:1] #renditions of the second image still pending
+        items.append(item)
+    return items
+
+
+def make_orders(count: int):
+    orders = []
+    for n, item in enumerate(make_items(count)):
+        lines = [ItemsInOrder(item=item, quantity=2, margin=500)]
+        order = OrderModel(status="pending", supplier_id=item.supplier_id, reseller_id=uuid4().hex,
+                           items=lines, buyer_id=uuid4().hex)
+        order.reseller_amount = order.supplier_amount = 1000 * n
+        order.expire_at = 0
+        order.created_at = order.updated_at = datetime.utcnow()
+        orders.append(order)
+    return orders
+
+
+def run(repeat: int) -> None:
+    app = Flask(__name__)
+    app.add_url_rule("/order/payment/<string:order_id>", "orderpaymentresource", lambda order_id: "")
+    cases = [("items", ItemPaginationSchema(), make_items), ("orders", OrderPaginationSchema(), make_orders)]
+    
+    with app.test_request_context("/items"):
+        print(f"{'schema':<8}{'objects':>8}{'marshmallow ms':>16}{'compiled ms':>13}{'speedup':>9}")
+        for name, schema, factory in cases:
+            dumper = fastdump.compile_schema(schema)
+            for size in SIZES:
+                page = KeysetPagination(factory(size), size, True, False, next_cursor="abc")
+                if dumper.dump(page) != schema.dump(page):
+                    raise SystemExit(f"{name}: compiled output differs from schema.dump")
+                slow = min(timeit.repeat(lambda: schema.dump(page), number=1, repeat=repeat)) * 1000
+                fast = min(timeit.repeat(lambda: dumper.dump(page), number=1, repeat=repeat)) * 1000
+                print(f"{name:<8}{size:>8}{slow:>16.2f}{fast:>13.2f}{slow / fast:>8.1f}x")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
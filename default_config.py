@@ -6,10 +6,21 @@ class DefaultConfig:
     SECRET_KEY = os.environ.get('SECRET_KEY')
     PROPAGATE_EXCEPTIONS = True
     UPLOADED_IMAGES_DEST = os.path.join('static', 'images')
+    UPLOADED_IMAGES_MAX_BYTES = 5 * 1024 * 1024 #per image, checked while the upload streams in
+    UPLOADED_IMAGES_MAX_BATCH = 10 #images per batch upload request
+    MAX_CONTENT_LENGTH = 5 * 1024 * 1024 #batch uploads get UPLOADED_IMAGES_MAX_BATCH images' worth, see libs.uploads
+    IMAGE_RENDITION_WORKERS = 2 #processes generating thumbnail, card and full renditions of uploads
+    IMAGE_CACHE_DIR = os.path.join('cache', 'images') #on-demand resized images, see libs/resizer.py
+    IMAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY')
     #JWT_REFRESH_TOKEN_EXPIRES = int(3600)
     JWT_BLACKLIST_ENABLED = True
     JWT_BLACKLIST_TOKEN_CHECKS = ['access', 'refresh']
     CACHE_TYPE = 'simple' 
     CACHE_DEFAULT_TIMEOUT = 10 * 60
-    RATELIMIT_HEADERS_ENABLED = True
\ No newline at end of file
+    CACHE_L1_MAX_ITEMS = 512 #in-process cache in front of CACHE_TYPE, 0 turns it off
+    CACHE_L1_MAX_BYTES = 32 * 1024 * 1024
+    CACHE_L1_TIMEOUT = 5
+    RATELIMIT_HEADERS_ENABLED = True
+    FAST_SERIALIZATION = False #compiled dumpers for listings and orjson responses, see libs/fastdump.py
+    ORDER_SWEEP_INTERVAL = 60 #seconds between expired-order sweeps in `flask run-sweeper`
\ No newline at end of file
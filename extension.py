@@ -4,7 +4,10 @@ from flask_caching import Cache
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
+from libs.lru import LRUCache
+
 ma = Marshmallow()
 jwt = JWTManager()
 cache = Cache()
+l1_cache = LRUCache()
 limiter = Limiter(key_func=get_remote_address)
\ No newline at end of file
@@ -0,0 +1,37 @@
+"""
+libs.background
+
+Runs short jobs off the request thread. Each job gets its own app context and
+database session, which is removed when the job ends. `run_when_done` queues a job
+only once a future has finished, so no worker sits blocked waiting for it.
+"""
+
+import traceback
+from concurrent.futures import ThreadPoolExecutor, Future
+from flask import current_app
+
+from db import db
+
+executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="background")
+
+
+def _run(app, func, *args, **kwargs):
+    with app.app_context():
+        try:
+            return func(*args, **kwargs)
+        except:
+            traceback.print_exc()
+        finally:
+            db.session.remove()
+
+
+def run_in_background(func, *args, **kwargs) -> Future:
+    return executor.submit(_run, current_app._get_current_object(), func, *args, **kwargs)
+
+
+def run_when_done(future: Future, func, *args, **kwargs) -> None:
+    """
+    Runs func(future, *args, **kwargs) in the background once future is done
+    """
+    app = current_app._get_current_object()
+    future.add_done_callback(lambda done: executor.submit(_run, app, func, done, *args, **kwargs))
@@ -0,0 +1,77 @@
+"""
+libs.blobs
+
+Content-addressed storage for uploaded item images. An upload is stored once under the
+sha256 of its bytes, `blobs/<hash[:2]>/<hash><extension>` in the images folder, however
+many items or suppliers upload the same photo; image rows reference it through
+ImageBlobModel, which counts the references and has the file removed with the last one.
+A blob's bytes never change under its name, so blob URLs are served as immutable.
+"""
+
+import os
+import re
+from flask import g, request
+from typing import Iterable
+
+from db import db
+from libs import img_helper, renditions
+from models.image import ImageBlobModel
+
+BLOB_FOLDER = "blobs"
+HASH_LENGTH = 64
+NAME_PATTERN = re.compile(r"^[0-9a-f]{64}(_[a-z]+)?\.[a-zA-Z0-9]+$")
+
+
+def get_root() -> str:
+    return img_helper.get_path(BLOB_FOLDER)
+
+
+def get_path(name: str) -> str:
+    return img_helper.get_path(name, folder=f"{BLOB_FOLDER}/{name[:2]}")
+
+
+def get_url_prefix() -> str:
+    """
+    External URL of the blob route, built once per request
+    """
+    if "blob_url_prefix" not in g:
+        g.blob_url_prefix = f"{request.url_root}images/{BLOB_FOLDER}/"
+    return g.blob_url_prefix
+
+
+def store(temporary: str, name: str) -> str:
+    """
+    Moves a spooled upload (libs.uploads) into place under its blob name. The bytes are
+    the same whoever wrote them, so replacing an existing file is harmless and restores
+    a missing one.
+    """
+    path = get_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(temporary, path)
+    return path
+
+
+def discard(temporary: str) -> None:
+    try:
+        os.remove(temporary)
+    except FileNotFoundError:
+        pass
+
+
+def remove(names: Iterable[str]) -> None:
+    """
+    Deletes blobs released by a committed ImageBlobModel.release, and their renditions.
+    Each file is deleted while its row is locked and still unreferenced, in a transaction
+    of its own: an upload of the same content that revived the blob in the meantime keeps
+    its file, and one that comes after waits and writes the file anew.
+    """
+    names = {name[:HASH_LENGTH]: name for name in names}
+    if not names:
+        return
+    try:
+        for blob_hash in ImageBlobModel.lock_unreferenced(list(names)):
+            path = get_path(names[blob_hash])
+            discard(path)
+            renditions.remove(path)
+    finally:
+        db.session.commit()
@@ -0,0 +1,290 @@
+"""
+libs.cache
+
+Namespace-based cache invalidation that works the same on every Flask-Caching backend
+(simple, filesystem, redis, memcached...), without listing the backend's keys.
+
+Each logical namespace, e.g. "items", "supplier:<id>:items" or "categories", has a
+generation number stored in the cache. Cached views put the generations of the
+namespaces they depend on into their keys, so invalidating a namespace is one write
+that bumps its generation: old entries are never looked up again and age out on their
+own. Generations start from the current time in milliseconds, so a generation that was
+evicted never comes back with a value an old entry is still keyed on.
+
+With `stale` set, `cached` serves stale-while-revalidate instead: entries are keyed
+without generations and remember the generations they were built from, so an expired
+or invalidated entry is still served while a single worker rebuilds it. Only the
+worker that wins the refresh lock recomputes; on a cold key, threads of the same
+process wait for the one computing it rather than all running the query. `served_stale`
+tells libs.conditional when a request got an entry from older generations, so it
+leaves out the ETag and Last-Modified of the current ones.
+
+Reads and writes go through the in-process LRU `l1_cache` first when it is enabled.
+Generations are held there too, for at most CACHE_L1_TIMEOUT seconds, so an
+invalidation made by another process is seen by this one within that window; one
+made by this process is seen immediately.
+"""
+
+import hashlib
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from flask import g, request
+from http import HTTPStatus
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from uuid import UUID, uuid4
+
+from extension import cache, l1_cache
+
+ITEMS = "items"
+CATEGORIES = "categories"
+NAMES = "names" #item and category names, behind the typeahead index of libs.suggest
+
+REFRESH_LOCK_TIMEOUT = 30 #seconds a refresh may hold its key before another worker takes over
+REFRESH_WAIT_INTERVAL = 0.05
+
+l2_stats = Counter()
+
+
+def supplier_items(supplier_id: str) -> str:
+    try:
+        supplier_id = UUID(str(supplier_id))
+    except ValueError:
+        pass
+    return f"supplier:{supplier_id}:items"
+
+
+def _get_shared(key: str) -> Any:
+    value = cache.get(key)
+    l2_stats["hits" if value is not None else "misses"] += 1
+    return value
+
+
+def _get(key: str) -> Any:
+    value = l1_cache.get(key)
+    if value is None:
+        value = _get_shared(key)
+        if value is not None:
+            l1_cache.set(key, value)
+    return value
+
+
+def _set(key: str, value: Any, timeout: int) -> None:
+    cache.set(key, value, timeout=timeout)
+    l1_cache.set(key, value, timeout)
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Counters of this process, served by GET /admin/cache/stats
+    """
+    return {"l1": l1_cache.stats(), "l2": {"hits": l2_stats["hits"], "misses": l2_stats["misses"]}}
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _generation_key(namespace: str) -> str:
+    return f"generation:{namespace}"
+
+
+def get_generations(namespaces: List[str]) -> List[int]:
+    keys = [_generation_key(namespace) for namespace in namespaces]
+    generations = [l1_cache.get(key) for key in keys]
+    missing = [key for key, generation in zip(keys, generations) if generation is None]
+    shared = dict(zip(missing, cache.get_many(*missing))) if missing else {}
+    for position, key in enumerate(keys):
+        if generations[position] is None:
+            generation = shared[key]
+            if generation is None:
+                cache.add(key, _now_ms(), timeout=0)
+                generation = cache.get(key)
+            l1_cache.set(key, generation)
+            generations[position] = generation
+    return generations
+
+
+def bump(namespace: str) -> Tuple[Optional[int], int]:
+    """
+    Moves a namespace to a new generation and returns the one it replaced, None if there
+    was none, along with the new one
+    """
+    key = _generation_key(namespace)
+    previous = cache.get(key)
+    generation = max((previous or 0) + 1, _now_ms())
+    _set(key, generation, timeout=0)
+    return previous, generation
+
+
+def invalidate(*namespaces: str) -> None:
+    for namespace in namespaces:
+        bump(namespace)
+
+
+def make_key(namespaces: List[str], *scope) -> str:
+    query = sorted(request.args.items(multi=True))
+    generations = get_generations(namespaces)
+    raw = repr((request.path, query, list(zip(namespaces, generations)), scope))
+    return "view:" + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def make_entry_key(namespaces: List[str], *scope) -> str:
+    query = sorted(request.args.items(multi=True))
+    raw = repr((request.path, query, list(namespaces), scope))
+    return "entry:" + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+@contextmanager
+def single_flight(key: str):
+    """
+    Lets one thread of this process at a time run the block for key; the others wait for it
+    """
+    with _flights_lock:
+        flight = _flights.setdefault(key, [threading.Lock(), 0])
+        flight[1] += 1
+    try:
+        with flight[0]:
+            yield
+    finally:
+        with _flights_lock:
+            flight[1] -= 1
+            if not flight[1]:
+                del _flights[key]
+
+
+def _claim_refresh(key: str) -> Optional[str]:
+    """
+    Takes the refresh lock of key and returns the token that releases it, None when another worker holds it
+    """
+    token = uuid4().hex
+    return token if cache.add(f"refresh:{key}", token, timeout=REFRESH_LOCK_TIMEOUT) else None
+
+
+def _release_refresh(key: str, token: Optional[str]) -> None:
+    """
+    Releases the lock only if it is still the one claimed with token, not one another
+    worker took after it expired. Backends have no compare-and-delete, so this narrows
+    the window to the time between the read and the delete.
+    """
+    if token is not None and cache.get(f"refresh:{key}") == token:
+        cache.delete(f"refresh:{key}")
+
+
+def _wait_for_entry(key: str, generations: List[int]) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    Waits for the worker holding the refresh lock to store the entry. Returns the entry, or
+    the token of the lock when it was freed first; neither when the wait timed out.
+    """
+    deadline = time.time() + REFRESH_LOCK_TIMEOUT
+    while time.time() < deadline:
+        time.sleep(REFRESH_WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None and entry["generations"] == generations:
+            return entry, None
+        token = _claim_refresh(key)
+        if token:
+            return None, token
+    return None, None
+
+
+def _refresh(key: str, generations: List[int], timeout: int, stale: int, func, *args, **kwargs):
+    response = func(*args, **kwargs)
+    if _status(response) == HTTPStatus.OK:
+        entry = {"response": response, "fresh_until": time.time() + timeout, "generations": generations}
+        _set(key, entry, timeout + stale)
+    return response
+
+
+def _is_fresh(entry: dict, generations: List[int]) -> bool:
+    return entry["generations"] == generations and entry["fresh_until"] > time.time()
+
+
+def _revalidating(key: str, generations: List[int], timeout: int, stale: int, func, *args, **kwargs):
+    entry = l1_cache.get(key)
+    if entry is not None and _is_fresh(entry, generations):
+        return entry["response"]
+    entry = _get_shared(key) #another process may have refreshed what this one holds
+    if entry is not None:
+        if _is_fresh(entry, generations):
+            l1_cache.set(key, entry)
+            return entry["response"]
+        token = _claim_refresh(key)
+        if not token:
+            if entry["generations"] != generations:
+                g.cache_served_stale = True
+            return entry["response"]
+        try:
+            return _refresh(key, generations, timeout, stale, func, *args, **kwargs)
+        finally:
+            _release_refresh(key, token)
+    
+    with single_flight(key):
+        entry = _get(key)
+        if entry is not None and entry["generations"] == generations:
+            return entry["response"]
+        token = _claim_refresh(key)
+        if not token:
+            entry, token = _wait_for_entry(key, generations)
+            if entry is not None:
+                return entry["response"]
+        try:
+            return _refresh(key, generations, timeout, stale, func, *args, **kwargs)
+        finally:
+            _release_refresh(key, token) #no-op after a timed out wait, the lock is someone else's
+
+
+def served_stale() -> bool:
+    """
+    Whether this request was answered from an entry built before its namespaces' current
+    generations, so the body must not be labelled with validators derived from them
+    """
+    return g.get("cache_served_stale", False)
+
+
+def _status(response) -> int:
+    if isinstance(response, tuple) and len(response) > 1:
+        return response[1]
+    return HTTPStatus.OK
+
+
+def cached(timeout: int, namespaces: Union[List[str], Callable[..., List[str]]], 
+           authorize: Callable = None, scope: Callable = None, stale: int = 0):
+    """
+    Caches a resource method's successful responses under the request path, query string
+    and the current generation of `namespaces`. `namespaces` may be a callable taking the
+    view's keyword arguments, for namespaces that depend on the URL.
+    
+    `authorize`, when given, runs before the cache is consulted and takes the view's keyword
+    arguments; a non-None result is an error response returned as is. `scope` adds the
+    caller's identity or tenant to the key, so one caller's body is never served to another.
+    
+    `stale` > 0 keeps serving an entry for that many seconds after it expires or its
+    namespaces are invalidated, while one worker recomputes it.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if authorize:
+                denied = authorize(**kwargs)
+                if denied is not None:
+                    return denied
+            names = namespaces(**kwargs) if callable(namespaces) else namespaces
+            if stale:
+                key = make_entry_key(names, scope(**kwargs) if scope else None)
+                return _revalidating(key, get_generations(names), timeout, stale, func, *args, **kwargs)
+            key = make_key(names, scope(**kwargs) if scope else None)
+            response = _get(key)
+            if response is None:
+                response = func(*args, **kwargs)
+                if _status(response) == HTTPStatus.OK:
+                    _set(key, response, timeout)
+            return response
+        return wrapper
+    return decorator
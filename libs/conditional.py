@@ -0,0 +1,91 @@
+"""
+libs.conditional
+
+Conditional GET for resource methods. A view decorated with `conditional` names a cheap
+version function, e.g. a max(updated_at) query or the namespace generations from
+libs.cache, and the ETag and Last-Modified headers are derived from it. When the
+client's If-None-Match or If-Modified-Since still matches, the answer is an empty
+304 Not Modified and the view, its queries and its serialization never run.
+"""
+
+import hashlib
+from datetime import datetime
+from functools import wraps
+from flask import Response, request
+from http import HTTPStatus
+from typing import Any, Callable, List, Optional, Tuple
+from werkzeug.http import http_date, quote_etag
+
+from libs.cache import get_generations, served_stale
+
+Version = Tuple[Any, Optional[datetime]]
+
+
+def namespace_version(namespaces: List[str]) -> Version:
+    """
+    Version of a response that depends only on cache namespaces; generations are
+    millisecond timestamps of the last invalidation, so they double as Last-Modified
+    """
+    generations = get_generations(namespaces)
+    return tuple(generations), datetime.utcfromtimestamp(max(generations) / 1000)
+
+
+def make_etag(token: Any) -> str:
+    query = sorted(request.args.items(multi=True))
+    raw = repr((request.path, query, token))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def not_modified(etag: str, last_modified: Optional[datetime]) -> bool:
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified and request.if_modified_since:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    return False
+
+
+def _with_headers(response, headers: dict):
+    if isinstance(response, Response):
+        response.headers.extend(headers)
+        return response
+    if not isinstance(response, tuple):
+        return response, HTTPStatus.OK, headers
+    data = response[0]
+    status = response[1] if len(response) > 1 else HTTPStatus.OK
+    extra = response[2] if len(response) > 2 else {}
+    if status != HTTPStatus.OK:
+        return response
+    return data, status, {**dict(extra), **headers}
+
+
+def conditional(version: Callable[..., Optional[Version]], authorize: Callable = None):
+    """
+    `version` takes the view's keyword arguments and returns (token, last_modified), where
+    token is anything whose repr changes whenever the response body does; None skips
+    the conditional handling, e.g. so the view can answer 404 itself.
+    `authorize` runs first, as in libs.cache.cached.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if authorize:
+                denied = authorize(**kwargs)
+                if denied is not None:
+                    return denied
+            current = version(**kwargs)
+            if current is None:
+                return func(*args, **kwargs)
+            token, last_modified = current
+            etag = make_etag(token)
+            headers = {"ETag": quote_etag(etag), "Cache-Control": "no-cache"}
+            if last_modified:
+                headers["Last-Modified"] = http_date(last_modified)
+            if not_modified(etag, last_modified):
+                return Response(status=HTTPStatus.NOT_MODIFIED, headers=headers)
+            response = func(*args, **kwargs)
+            if served_stale():
+                #the body predates `current`; labelling it so would pin clients to it with 304s
+                headers = {"Cache-Control": "no-cache"}
+            return _with_headers(response, headers)
+        return wrapper
+    return decorator
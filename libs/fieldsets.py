@@ -0,0 +1,49 @@
+"""
+libs.fieldsets
+
+Sparse fieldsets for list endpoints. `?fields=id,name,price` narrows the dumped page
+to those fields and the query to the columns they need, so wide columns such as
+item descriptions are never fetched for a listing that does not show them.
+"""
+
+from functools import lru_cache
+from marshmallow import ValidationError
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+
+
+def parse_fields(value: Optional[str], allowed: Iterable[str]) -> Optional[FrozenSet[str]]:
+    """
+    The field names of a comma separated `fields` argument, or None when every field is wanted
+    """
+    if not value:
+        return None
+    requested = frozenset(name.strip() for name in value.split(",") if name.strip())
+    unknown = requested.difference(allowed)
+    if unknown:
+        raise ValidationError({"fields": ["Unknown field: {}.".format(", ".join(sorted(unknown)))]})
+    return requested or None
+
+
+def project(query, model, fieldset: FrozenSet[str], required: Iterable[str],
+            depends: Dict[str, Tuple[str, ...]]):
+    """
+    Loads only the columns behind fieldset, plus `required` ones such as the primary key and
+    the sort columns. `depends` maps computed fields to the columns they are built from;
+    relationships are left to their own loading strategy.
+    """
+    columns = set(inspect(model).column_attrs.keys())
+    names = set(required)
+    for name in fieldset:
+        names.update(depends.get(name, (name,)))
+    return query.options(load_only(*[getattr(model, name) for name in sorted(names & columns)]))
+
+
+@lru_cache(maxsize=128)
+def sparse_schema(schema_class, fieldset: FrozenSet[str], nested: str = "data"):
+    """
+    Pagination schema whose `nested` page items are limited to fieldset, built once per fieldset
+    """
+    envelope = [name for name in schema_class._declared_fields if name != nested]
+    return schema_class(only=envelope + ["{}.{}".format(nested, name) for name in sorted(fieldset)])
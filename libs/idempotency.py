@@ -0,0 +1,74 @@
+"""
+libs.idempotency
+
+Lets clients retry a POST safely by sending an `Idempotency-Key` header. The first
+request with a key runs normally and its response is stored; a retry with the same
+key gets the stored response back without running the resource again.
+Keys are scoped to the endpoint and the caller, and expire after a day. A claim whose
+response could not be stored is dropped, and one left behind by a crashed worker lapses
+after IDEMPOTENCY_KEY_LEASE, so retries never stay locked out for long.
+"""
+
+import traceback
+from functools import wraps
+from hashlib import sha256
+from http import HTTPStatus
+from flask import request
+from flask_jwt_extended import get_jwt_identity
+
+from db import db
+from libs.strings import gettext
+from models.idempotency import IdempotencyKeyModel
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+
+def _scoped_key(key: str) -> str:
+    scope = f"{request.method}:{request.path}:{get_jwt_identity() or ''}:{key}"
+    return sha256(scope.encode("utf-8")).hexdigest()
+
+
+def idempotent(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return func(*args, **kwargs)
+        
+        key = _scoped_key(key)
+        record = IdempotencyKeyModel.find_by_key(key)
+        if record and record.status_code is not None:
+            return record.body, record.status_code
+        
+        record = None if record else IdempotencyKeyModel.claim(key)
+        if not record:
+            return {"message": gettext("idempotency_key_in_use")}, HTTPStatus.CONFLICT
+        
+        try:
+            response = func(*args, **kwargs)
+        except:
+            _release(key)
+            raise
+        
+        if isinstance(response, tuple):
+            body, status_code = response[0], response[1]
+        else:
+            body, status_code = response, HTTPStatus.OK
+        if status_code < HTTPStatus.INTERNAL_SERVER_ERROR:
+            try:
+                record.store_response(body, status_code)
+            except:
+                traceback.print_exc()
+                _release(key)
+        else:
+            _release(key)
+        return response
+    return wrapper
+
+
+def _release(key: str) -> None:
+    try:
+        db.session.rollback()
+        IdempotencyKeyModel.release(key)
+    except:
+        traceback.print_exc()
@@ -1,5 +1,6 @@
 import os
 import re
+from flask import g, url_for
 from werkzeug.datastructures import FileStorage
 from flask_uploads import UploadSet, IMAGES
 from typing import Union
@@ -12,6 +13,14 @@ def save_image(image: FileStorage, folder: str=None, name: str=None) -> str:
 def get_path(filename: str=None, folder: str=None) -> str:
     return IMAGE_SET.path(filename, folder)
 
+def get_url_prefix() -> str:
+    """
+    External URL of the images folder, built once per request instead of one url_for per image
+    """
+    if "image_url_prefix" not in g:
+        g.image_url_prefix = url_for('static', filename='images/', _external=True)
+    return g.image_url_prefix
+
 def find_image_any_format(filename: str=None, folder: str=None) -> Union[str, None]:
     for _format in IMAGES:
         image = f"{filename}.{_format}"
@@ -37,4 +46,7 @@ def get_basename(file: Union[str, FileStorage]) -> str:
 
 def get_extension(file: Union[str, FileStorage]) -> str:
     file_name = _retrieve_filename(file)
-    return os.path.splitext(file_name)[1]
\ No newline at end of file
+    return os.path.splitext(file_name)[1]
+
+def is_extension_allowed(file: Union[str, FileStorage]) -> bool:
+    return IMAGE_SET.file_allowed(file, get_basename(file))
@@ -0,0 +1,129 @@
+"""
+libs.keyset
+
+Keyset (cursor) pagination. Each page continues strictly after the sort key of the
+last row of the previous page instead of skipping rows with OFFSET, so a deep page
+costs the same as the first one and no COUNT(*) is needed unless asked for.
+
+The sort key always ends with a unique column (the id) to make it total, and cursors
+are opaque url-safe strings. An empty cursor asks for the first page.
+
+Totals are optional: "exact" runs COUNT(*), "estimated" reads the planner's row
+estimate on Postgres (no scan, as fresh as the last ANALYZE) and "none" skips it.
+"""
+
+import base64
+import json
+from datetime import datetime
+from flask_sqlalchemy import Pagination
+from marshmallow import ValidationError
+from sqlalchemy import asc, desc, tuple_, DateTime
+from typing import List, Optional, Union
+
+COUNT_MODES = ("exact", "estimated", "none")
+
+
+class KeysetPagination:
+    
+    def __init__(self, items: List, per_page: int, has_next: bool, has_prev: bool, 
+                 next_cursor: str = None, prev_cursor: str = None, total: int = None):
+        self.items = items
+        self.per_page = per_page
+        self.has_next = has_next
+        self.has_prev = has_prev
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+
+def encode_cursor(values: List, direction: str) -> str:
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    payload = json.dumps({"v": values, "d": direction}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: List) -> (List, str):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        values, direction = payload["v"], payload["d"]
+        if len(values) != len(columns) or direction not in ("next", "prev"):
+            raise ValueError
+        values = [datetime.fromisoformat(value) if isinstance(column.type, DateTime) and value else value 
+                  for column, value in zip(columns, values)]
+    except (ValueError, TypeError, KeyError):
+        raise ValidationError({"cursor": ["Invalid cursor."]})
+    return values, direction
+
+
+def _row_values(row, columns: List) -> List:
+    return [getattr(row, column.key) for column in columns]
+
+
+def estimate_count(query) -> Optional[int]:
+    session = query.session
+    if session.get_bind().dialect.name != "postgresql":
+        return None
+    compiled = query.order_by(None).statement.compile(session.get_bind())
+    plan = session.connection().execute("EXPLAIN (FORMAT JSON) {}".format(compiled), compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def count_rows(query, count: str) -> Optional[int]:
+    if count == "none":
+        return None
+    if count == "estimated":
+        estimate = estimate_count(query)
+        if estimate is not None:
+            return estimate
+    return query.order_by(None).count()
+
+
+def keyset_paginate(query, columns: List, order: str, per_page: int, 
+                    cursor: Optional[str] = None, count: str = "none") -> KeysetPagination:
+    total = count_rows(query, count)
+    
+    values, direction = decode_cursor(cursor, columns) if cursor else (None, "next")
+    backwards = direction == "prev"
+    ascending = (order == "asc") != backwards
+    
+    if values is not None:
+        key, bound = tuple_(*columns), tuple_(*values)
+        query = query.filter(key > bound if ascending else key < bound)
+    sort_logic = [asc(column) if ascending else desc(column) for column in columns]
+    rows = query.order_by(*sort_logic).limit(per_page + 1).all()
+    
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, values is not None
+    
+    next_cursor = encode_cursor(_row_values(rows[-1], columns), "next") if rows and has_next else None
+    prev_cursor = encode_cursor(_row_values(rows[0], columns), "prev") if rows and has_prev else None
+    return KeysetPagination(rows, per_page, has_next, has_prev, next_cursor, prev_cursor, total)
+
+
+def paginate(query, columns: List, page: int, per_page: int, order: str, 
+             cursor: Optional[str] = None, count: str = "exact") -> Union[Pagination, KeysetPagination]:
+    """
+    Keyset pagination over `columns` when a cursor is given, otherwise offset pagination
+    by page number sorted on all of them, so ties on the first column (equal ranks or
+    timestamps) keep a fixed order across pages. Offset pages always need a total for
+    their links, so "none" counts exactly there.
+    """
+    if cursor is not None:
+        return keyset_paginate(query, columns, order, per_page, cursor, count)
+    
+    direction = asc if order == 'asc' else desc
+    sort_logic = [direction(column) for column in columns]
+    
+    if count != "estimated":
+        return query.order_by(*sort_logic).paginate(page=page, per_page=per_page)
+    
+    page = max(page, 1)
+    items = query.order_by(*sort_logic).limit(per_page).offset((page - 1) * per_page).all()
+    return Pagination(query, page, per_page, count_rows(query, count), items)
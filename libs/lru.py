@@ -0,0 +1,89 @@
+"""
+libs.lru
+
+A thread-safe in-process LRU cache bounded by entry count and by the pickled size of its
+values, with a short time to live. It is the first tier in front of the shared
+Flask-Caching backend: a hit costs neither a network hop nor deserialization.
+Values are handed out as stored, so callers must not mutate them.
+
+Configured with CACHE_L1_MAX_ITEMS, CACHE_L1_MAX_BYTES and CACHE_L1_TIMEOUT;
+CACHE_L1_MAX_ITEMS = 0 turns the tier off.
+"""
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict
+
+
+class LRUCache:
+
+    def __init__(self, max_items: int = 0, max_bytes: int = 0, timeout: int = 0):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._entries = OrderedDict() #key -> (value, size, expire_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app) -> None:
+        self.max_items = app.config.get("CACHE_L1_MAX_ITEMS", 0)
+        self.max_bytes = app.config.get("CACHE_L1_MAX_BYTES", 0)
+        self.timeout = app.config.get("CACHE_L1_TIMEOUT", 0)
+        self.clear()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_items > 0 and self.timeout > 0
+
+    def get(self, key: str) -> Any:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] <= time.monotonic():
+                if entry is not None:
+                    self._discard(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: str, value: Any, timeout: int = None) -> None:
+        if not self.enabled:
+            return
+        try:
+            size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            return
+        ttl = self.timeout if not timeout else min(timeout, self.timeout)
+        with self._lock:
+            self._discard(key)
+            if self.max_bytes and size > self.max_bytes:
+                return
+            self._entries[key] = (value, size, time.monotonic() + ttl)
+            self._bytes += size
+            while len(self._entries) > self.max_items or (self.max_bytes and self._bytes > self.max_bytes):
+                self._discard(next(iter(self._entries)))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._discard(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "items": len(self._entries), "bytes": self._bytes}
+
+    def _discard(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
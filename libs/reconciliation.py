@@ -0,0 +1,73 @@
+"""
+libs.reconciliation
+
+Verifies payments that are still awaiting a charge result against Paystack in bulk,
+so request workers never have to. Run it with `flask reconcile-payments`.
+
+Verification calls share one HTTP session, run on a bounded thread pool and are
+spaced by a rate limiter to stay within the provider's limits. Results are written
+back with a handful of set-based updates.
+"""
+
+import threading
+import time
+import requests
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import Tuple
+
+from models.payment import PaymentModel, ORDER_STATUS_FOR_CHARGE
+from transaction import PAYSTACK_SECRET_KEY
+
+PAYSTACK_VERIFY_URL = "https://api.paystack.co/transaction/verify/{}"
+VERIFY_TIMEOUT = 10 #seconds
+
+
+class RateLimiter:
+    """
+    Lets at most `rate` calls start per second, shared by all threads
+    """
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next_call = time.monotonic()
+        self._lock = threading.Lock()
+        
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_call - now
+            self._next_call = max(now, self._next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _session(workers: int) -> requests.Session:
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {PAYSTACK_SECRET_KEY}"
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=workers))
+    return session
+
+
+def reconcile_payments(workers: int = 8, rate: float = 10, limit: int = 1000) -> Counter:
+    references = PaymentModel.find_unreconciled_references(limit)
+    session = _session(workers)
+    limiter = RateLimiter(rate)
+    
+    def verify(reference: str) -> Tuple[str, str]:
+        limiter.wait()
+        try:
+            response = session.get(PAYSTACK_VERIFY_URL.format(reference), timeout=VERIFY_TIMEOUT)
+            return reference, response.json()["data"]["status"]
+        except:
+            return reference, None
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = dict(pool.map(verify, references))
+    session.close()
+    
+    summary = Counter(checked=len(references))
+    for status in results.values():
+        summary[status if status in ORDER_STATUS_FOR_CHARGE else ("error" if status is None else "pending")] += 1
+    summary["updated"] = PaymentModel.record_charges(results)
+    return summary
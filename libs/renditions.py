@@ -0,0 +1,106 @@
+"""
+libs.renditions
+
+Fixed-size WebP renditions of uploaded item images, so listings never ship originals.
+
+An upload is decoded once and scaled down to every size in RENDITIONS (longest edge, aspect
+ratio kept, never enlarged), largest first, each size starting from the previous one.
+Files are written next to the original as `<stem>_<rendition>.webp`. The work runs in a
+process pool off the request thread, once per image blob; when it finishes the blob is
+marked renditions_ready, and only then do the items showing it expose the rendition URLs.
+Waiting for the pool takes no thread: the marking is queued from a done callback.
+"""
+
+import os
+import traceback
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from flask import current_app
+from typing import Dict, List
+
+from PIL import Image, ImageOps
+
+from libs.background import run_when_done
+from libs.cache import invalidate, ITEMS, supplier_items
+from models.image import ImageBlobModel
+from models.item import ItemModel
+
+RENDITIONS = (
+    ("full", 1280),
+    ("card", 480),
+    ("thumbnail", 160),
+)
+RENDITION_FORMAT = "WEBP"
+RENDITION_EXTENSION = ".webp"
+RENDITION_QUALITY = 80
+
+_pool = None
+
+
+def rendition_name(stem: str, rendition: str) -> str:
+    return f"{stem}_{rendition}{RENDITION_EXTENSION}"
+
+
+def rendition_names(image_name: str) -> Dict[str, str]:
+    stem = os.path.splitext(image_name)[0]
+    return {rendition: rendition_name(stem, rendition) for rendition, _ in RENDITIONS}
+
+
+def render(source_path: str) -> List[str]:
+    """
+    Writes every rendition of source_path next to it and returns their paths.
+    Runs in a pool process, so it takes and returns plain paths only.
+    """
+    folder, image_name = os.path.split(source_path)
+    names = rendition_names(image_name)
+    paths = []
+    with Image.open(source_path) as original:
+        original.draft("RGB", (RENDITIONS[0][1], RENDITIONS[0][1])) #lets JPEG decode at a reduced scale
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        for rendition, size in RENDITIONS:
+            image.thumbnail((size, size), Image.LANCZOS)
+            path = os.path.join(folder, names[rendition])
+            image.save(path + ".tmp", RENDITION_FORMAT, quality=RENDITION_QUALITY, method=4)
+            os.replace(path + ".tmp", path)
+            paths.append(path)
+    return paths
+
+
+def remove(source_path: str) -> None:
+    folder, image_name = os.path.split(source_path)
+    for name in rendition_names(image_name).values():
+        try:
+            os.remove(os.path.join(folder, name))
+        except FileNotFoundError:
+            pass
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        workers = current_app.config.get("IMAGE_RENDITION_WORKERS") or None
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _mark_ready(future: Future, blob_hash: str) -> None:
+    try:
+        future.result()
+    except:
+        traceback.print_exc()
+        return
+    supplier_ids = ItemModel.touch_by_blob(blob_hash)
+    ImageBlobModel.mark_renditions_ready(blob_hash)
+    if supplier_ids:
+        invalidate(ITEMS, *[supplier_items(supplier_id) for supplier_id in supplier_ids])
+
+
+def generate(source_path: str, blob_hash: str) -> Future:
+    """
+    Queues the renditions of a newly stored blob; once they are written the blob is marked
+    ready and the items showing it get a new updated_at, so their ETags change
+    """
+    future = get_pool().submit(render, source_path)
+    run_when_done(future, _mark_ready, blob_hash)
+    return future
@@ -0,0 +1,175 @@
+"""
+libs.resizer
+
+On-demand resized WebP copies of item images for arbitrary client widths.
+
+Requested widths are rounded up to one of WIDTHS and qualities to a multiple of
+QUALITY_STEP, so a handful of variants exist per image however clients ask. Variants are
+written to a disk cache (IMAGE_CACHE_DIR) keyed by the source's path, size and mtime, so a
+replaced original never serves an old copy. The cache is capped at IMAGE_CACHE_MAX_BYTES
+across all workers and evicts least recently served files first, going by file mtimes,
+which hits refresh. Usage is rescanned periodically, so the cap can be overshot by what
+other workers add between scans. A file can be evicted by another worker right after it
+was looked up, so callers regenerate it when it is gone by the time they open it.
+
+Resizing runs in the renditions process pool. Concurrent requests for the same variant
+in a process wait for the first one; files are written to a temporary name and renamed,
+so another process doing the same work never exposes a partial file.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from flask import current_app
+from typing import List, Tuple
+
+from PIL import Image, ImageOps
+
+from libs.cache import single_flight
+from libs.renditions import RENDITION_FORMAT, RENDITION_EXTENSION, get_pool
+
+WIDTHS = (64, 128, 160, 240, 320, 480, 640, 800, 960, 1280, 1600, 1920)
+DEFAULT_QUALITY = 80
+QUALITY_STEP = 10
+MIN_QUALITY = 30
+MAX_QUALITY = 90
+SCAN_INTERVAL = 60 #seconds between scans of the disk cache when under its cap
+EVICT_TO = 0.9 #share of IMAGE_CACHE_MAX_BYTES left after an eviction, so the next adds do not evict again
+
+
+def quantise_width(width: int) -> int:
+    for allowed in WIDTHS:
+        if width <= allowed:
+            return allowed
+    return WIDTHS[-1]
+
+
+def quantise_quality(quality: int) -> int:
+    quality = min(max(quality, MIN_QUALITY), MAX_QUALITY)
+    return int(round(quality / QUALITY_STEP) * QUALITY_STEP)
+
+
+def resize(source_path: str, target_path: str, width: int, quality: int) -> None:
+    """
+    Writes source_path scaled down to width as WebP; runs in a pool process
+    """
+    with Image.open(source_path) as original:
+        original.draft("RGB", (width, width))
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        if image.width > width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        temporary = f"{target_path}.{os.getpid()}.tmp"
+        image.save(temporary, RENDITION_FORMAT, quality=quality, method=4)
+        os.replace(temporary, target_path)
+
+
+class DiskCache:
+    """
+    Variants on disk, shared by every worker. Hits refresh a file's mtime. Each process
+    tracks usage as of its last scan of the folder plus its own adds since, and rescans,
+    evicting by mtime down to EVICT_TO of the cap, only when that estimate goes over the
+    cap or SCAN_INTERVAL has passed, which picks up what the other workers wrote. One
+    thread per process scans at a time, and adds never wait for it.
+    """
+
+    def __init__(self, folder: str, max_bytes: int):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._used = 0
+        self._next_scan = 0.0 #the first add scans
+        self._lock = threading.Lock()
+        self._scan_lock = threading.Lock()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.folder, key[:2], key + RENDITION_EXTENSION)
+
+    def get(self, key: str):
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def add(self, path: str) -> None:
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._used += size
+            if self._used <= self.max_bytes and time.monotonic() < self._next_scan:
+                return
+        if self._scan_lock.acquire(blocking=False):
+            try:
+                self._evict(keep=path)
+            finally:
+                self._scan_lock.release()
+
+    def _evict(self, keep: str) -> None:
+        entries = self._scan()
+        used = sum(size for _, _, size in entries)
+        if used > self.max_bytes:
+            target = self.max_bytes * EVICT_TO
+            for _, victim, size in sorted(entries):
+                if used <= target:
+                    break
+                if victim == keep:
+                    continue
+                try:
+                    os.remove(victim)
+                except FileNotFoundError:
+                    pass
+                used -= size
+        with self._lock:
+            self._used = used
+            self._next_scan = time.monotonic() + SCAN_INTERVAL
+
+    def _scan(self) -> List[Tuple[float, str, int]]:
+        entries = []
+        for root, _, names in os.walk(self.folder):
+            for name in names:
+                if not name.endswith(RENDITION_EXTENSION):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError: #evicted by another worker meanwhile
+                    continue
+                entries.append((stat.st_mtime, path, stat.st_size))
+        return entries
+
+
+_disk_cache = None
+
+
+def get_disk_cache() -> DiskCache:
+    global _disk_cache
+    if _disk_cache is None:
+        _disk_cache = DiskCache(current_app.config["IMAGE_CACHE_DIR"], current_app.config["IMAGE_CACHE_MAX_BYTES"])
+    return _disk_cache
+
+
+def get_resized(source_path: str, width: int, quality: int) -> str:
+    """
+    Path of the cached variant of source_path, created on first request
+    """
+    stat = os.stat(source_path)
+    raw = f"{source_path}:{stat.st_size}:{stat.st_mtime_ns}:{width}:{quality}"
+    key = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+    disk_cache = get_disk_cache()
+
+    path = disk_cache.get(key)
+    if path:
+        return path
+    with single_flight(f"resize:{key}"):
+        path = disk_cache.get(key)
+        if path:
+            return path
+        path = disk_cache.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        get_pool().submit(resize, source_path, path, width, quality).result()
+        disk_cache.add(path)
+        return path
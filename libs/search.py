@@ -0,0 +1,78 @@
+"""
+libs.search
+
+Full-text search over item names and descriptions.
+
+On Postgres the item table carries a generated `search_vector` tsvector column behind a
+GIN index. On SQLite (test runs) an external-content FTS5 table `item_fts` is kept in sync
+by triggers. Both are created together with the item table by db.create_all; existing
+databases need the same statements run once. Any other database falls back to ILIKE.
+
+Every keyword term is prefix-matched and all terms must match. The 'simple' text search
+configuration is used so a prefix is never compared against a stemmed word.
+"""
+
+import re
+from sqlalchemy import DDL, event, func, literal_column, table, column
+from typing import List, Optional, Tuple
+
+TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+POSTGRES_DDL = (
+    """ALTER TABLE item ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'B')) STORED""",
+    "CREATE INDEX ix_item_search_vector ON item USING GIN (search_vector)",
+)
+
+SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE item_fts USING fts5(name, description, content='item', content_rowid='rowid')",
+    """CREATE TRIGGER item_fts_insert AFTER INSERT ON item BEGIN
+        INSERT INTO item_fts(rowid, name, description) VALUES (new.rowid, new.name, new.description);
+    END""",
+    """CREATE TRIGGER item_fts_delete AFTER DELETE ON item BEGIN
+        INSERT INTO item_fts(item_fts, rowid, name, description) VALUES ('delete', old.rowid, old.name, old.description);
+    END""",
+    """CREATE TRIGGER item_fts_update AFTER UPDATE OF name, description ON item BEGIN
+        INSERT INTO item_fts(item_fts, rowid, name, description) VALUES ('delete', old.rowid, old.name, old.description);
+        INSERT INTO item_fts(rowid, name, description) VALUES (new.rowid, new.name, new.description);
+    END""",
+)
+
+item_fts = table("item_fts", column("rowid"), column("rank"))
+
+
+def install(item_table) -> None:
+    for statement in POSTGRES_DDL:
+        event.listen(item_table, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+    for statement in SQLITE_DDL:
+        event.listen(item_table, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+
+
+def search_terms(keyword: str) -> List[str]:
+    return TERM_PATTERN.findall(keyword or "")
+
+
+def apply_search(query, model, keyword: str) -> Tuple[object, Optional[object]]:
+    """
+    Filters `query` on `keyword` and returns it with a relevance expression (higher is
+    better), or None for the relevance when there is nothing to rank by.
+    """
+    terms = search_terms(keyword)
+    if not terms:
+        return query, None
+    
+    dialect = query.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        tsquery = func.to_tsquery("simple", " & ".join(f"{term}:*" for term in terms))
+        vector = literal_column("item.search_vector")
+        return query.filter(vector.op("@@")(tsquery)), func.ts_rank(vector, tsquery)
+    
+    if dialect == "sqlite":
+        match = " ".join(f'"{term}"*' for term in terms)
+        query = query.join(item_fts, item_fts.c.rowid == literal_column("item.rowid")). \
+            filter(literal_column("item_fts").op("MATCH")(match))
+        return query, -item_fts.c.rank
+    
+    keyword = "%{}%".format(keyword)
+    return query.filter((model.name.ilike(keyword)) | (model.description.ilike(keyword))), None
@@ -0,0 +1,116 @@
+"""
+libs.suggest
+
+In-memory prefix index over item and category names for typeahead.
+
+Entries are kept in a sorted list of (lowercased name, kind, id, name) and looked up
+with bisect, so a lookup is one binary search plus a short slice. Writers build a new
+list and swap it in, so readers never take the lock. Each worker process holds its own
+copy, loaded from the database on first use. The resources that create, rename or
+delete items and categories `publish` the change: it is applied to the local copy and
+the NAMES cache namespace is bumped. The writer takes the generation it produced as its
+copy's version, so only the other workers see a new generation on their next lookup and
+reload, while requests that arrive during the reload are answered from the previous copy.
+"""
+
+import threading
+from bisect import bisect_left, insort
+from typing import Callable, Dict, Iterable, List, Tuple
+from uuid import UUID
+
+from libs.cache import bump, get_generations, NAMES
+from models.category import Category
+from models.item import ItemModel
+
+
+def _entry(kind: str, _id: str, name: str) -> Tuple[str, str, str, str]:
+    return (name.lower(), kind, str(UUID(str(_id))), name)
+
+
+class PrefixIndex:
+    
+    def __init__(self):
+        self._entries = []
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.version = None
+        
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+    
+    def load(self, entries: Iterable[Tuple[str, str, str]], version=None) -> None:
+        entries = sorted(_entry(kind, _id, name) for kind, _id, name in entries)
+        with self._lock:
+            self._entries = entries
+            self._loaded = True
+            self.version = version
+        
+    def add(self, kind: str, _id: str, name: str) -> None:
+        entry = _entry(kind, _id, name)
+        with self._lock:
+            position = bisect_left(self._entries, entry)
+            if position < len(self._entries) and self._entries[position] == entry:
+                return #already loaded from the database
+            entries = list(self._entries)
+            insort(entries, entry)
+            self._entries = entries
+            
+    def remove(self, kind: str, _id: str, name: str) -> None:
+        entry = _entry(kind, _id, name)
+        with self._lock:
+            position = bisect_left(self._entries, entry)
+            if position < len(self._entries) and self._entries[position] == entry:
+                self._entries = self._entries[:position] + self._entries[position + 1:]
+                
+    def rename(self, kind: str, _id: str, old_name: str, new_name: str) -> None:
+        self.remove(kind, _id, old_name)
+        self.add(kind, _id, new_name)
+        
+    def search(self, prefix: str, limit: int) -> List[Dict]:
+        prefix = prefix.lower()
+        entries = self._entries
+        position = bisect_left(entries, (prefix,))
+        suggestions = []
+        while position < len(entries) and len(suggestions) < limit and entries[position][0].startswith(prefix):
+            _, kind, _id, name = entries[position]
+            suggestions.append({"type": kind, "id": _id, "name": name})
+            position += 1
+        return suggestions
+
+
+suggestions = PrefixIndex()
+_reload_lock = threading.Lock()
+
+
+def ensure_loaded() -> PrefixIndex:
+    """
+    The index, reloaded first when the NAMES generation has moved since it was loaded.
+    One thread reloads; the others keep using the previous entries unless there are none yet.
+    """
+    version = get_generations([NAMES])[0]
+    if suggestions.loaded and suggestions.version == version:
+        return suggestions
+    if not _reload_lock.acquire(blocking=not suggestions.loaded):
+        return suggestions
+    try:
+        if not (suggestions.loaded and suggestions.version == version):
+            entries = [("item", _id, name) for _id, name in ItemModel.find_all_names()]
+            entries += [("category", _id, name) for _id, name in Category.find_all_names()]
+            suggestions.load(entries, version)
+    finally:
+        _reload_lock.release()
+    return suggestions
+
+
+def publish(change: Callable, *args) -> None:
+    """
+    Applies a committed name change of this worker, e.g. publish(suggestions.add, "item", id, name),
+    and bumps NAMES so the other workers reload. The index keeps up with the generation it
+    produced when it was current before the bump; otherwise it reloads as usual.
+    """
+    with _reload_lock:
+        previous, generation = bump(NAMES)
+        change(*args)
+        if suggestions.loaded and suggestions.version == previous:
+            suggestions.version = generation
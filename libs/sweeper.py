@@ -0,0 +1,56 @@
+"""
+libs.sweeper
+
+Cancels orders that expired before being paid and returns their stock.
+Run it once with `flask sweep-orders` (e.g. from cron), or keep one `flask run-sweeper`
+process running, which sweeps every ORDER_SWEEP_INTERVAL seconds and also purges expired
+Idempotency-Key responses. Nothing starts at import, so web workers and other CLI
+commands never run sweepers of their own.
+"""
+
+import threading
+import traceback
+
+from db import db
+from libs.cache import invalidate, ITEMS, supplier_items
+from models.idempotency import IdempotencyKeyModel
+from models.order import OrderModel
+
+SWEEP_BATCH_SIZE = 500
+
+
+def sweep_expired_orders(batch_size: int = SWEEP_BATCH_SIZE) -> int:
+    total = 0
+    supplier_ids = set()
+    while True:
+        cancelled, restocked = OrderModel.cancel_expired(batch_size)
+        total += cancelled
+        supplier_ids |= restocked
+        if cancelled < batch_size:
+            break
+    if total:
+        invalidate(ITEMS, *[supplier_items(supplier_id) for supplier_id in supplier_ids])
+    return total
+
+
+class OrderSweeper(threading.Thread):
+    
+    def __init__(self, app, interval: int):
+        super().__init__(name="order-sweeper", daemon=True)
+        self.app = app
+        self.interval = interval
+        self._stopped = threading.Event()
+        
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            with self.app.app_context():
+                try:
+                    sweep_expired_orders()
+                    IdempotencyKeyModel.purge_expired()
+                except:
+                    traceback.print_exc()
+                finally:
+                    db.session.remove()
+                    
+    def stop(self) -> None:
+        self._stopped.set()
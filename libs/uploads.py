@@ -0,0 +1,186 @@
+"""
+libs.uploads
+
+Streaming image uploads. StreamingRequest has the multipart parser write every uploaded
+file straight into an ImageUploadStream, a temporary file in the blob folder, instead of
+spooling the whole body first. The extension is checked when the part starts and the
+magic bytes as soon as its first bytes arrive, the body is hashed as it is written, and
+a part over UPLOADED_IMAGES_MAX_BYTES aborts the request right away. The resource then
+claims the temporary file and moves it into place with an atomic rename, see libs.blobs;
+unclaimed ones are discarded when the request closes or its parsing aborts.
+"""
+
+import hashlib
+import os
+import tempfile
+from flask import Request, current_app
+from typing import Tuple
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge, UnsupportedMediaType
+
+from libs import blobs, img_helper
+from libs.strings import gettext
+
+CHUNK_SIZE = 64 * 1024
+BATCH_ENDPOINT = "item.upload.batch" #the only route whose bodies may exceed MAX_CONTENT_LENGTH
+MULTIPART_OVERHEAD = 64 * 1024
+HEAD_SIZE = 16 #enough for every signature below
+SIGNATURES = {
+    "jpg": (b"\xff\xd8\xff",),
+    "jpe": (b"\xff\xd8\xff",),
+    "jpeg": (b"\xff\xd8\xff",),
+    "png": (b"\x89PNG\r\n\x1a\n",),
+    "gif": (b"GIF87a", b"GIF89a"),
+    "bmp": (b"BM",),
+    "svg": (b"<",),
+}
+
+
+def matches_extension(head: bytes, extension: str) -> bool:
+    """
+    Whether a file's first bytes are those of its extension's format; unknown formats never match
+    """
+    signatures = SIGNATURES.get(extension.lstrip(".").lower(), ())
+    head = head.lstrip(b"\xef\xbb\xbf \t\r\n") if extension.lower() == ".svg" else head
+    return head.startswith(signatures) if signatures else False
+
+
+class ImageUploadStream:
+    """
+    File the multipart parser writes one uploaded image into; FileStorage reads it back
+    """
+
+    def __init__(self, folder: str, filename: str, max_bytes: int):
+        filename = filename or ""
+        self.extension = img_helper.get_extension(filename)
+        if not img_helper.is_extension_allowed(filename):
+            raise BadRequest(gettext("item_image_illegal_extension").format(self.extension))
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._head = b""
+        os.makedirs(folder, exist_ok=True)
+        descriptor, self.path = tempfile.mkstemp(suffix=".tmp", dir=folder)
+        self._file = os.fdopen(descriptor, "w+b")
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.max_bytes and self.size > self.max_bytes:
+            self._abort(RequestEntityTooLarge())
+        if self._head is not None:
+            self._head += chunk
+            if len(self._head) < HEAD_SIZE:
+                return
+            chunk = self._check_head()
+        self._digest.update(chunk)
+        self._file.write(chunk)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        #the parser seeks back to 0 once the part is complete
+        if self._head is not None:
+            head = self._check_head()
+            self._digest.update(head)
+            self._file.write(head)
+        return self._file.seek(offset, whence)
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def readline(self, size: int = -1) -> bytes:
+        return self._file.readline(size)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+    def claim(self) -> str:
+        """
+        Hands the temporary file over to the caller, who moves or discards it
+        """
+        self._file.flush()
+        path, self.path = self.path, None
+        return path
+
+    def close(self) -> None:
+        self._file.close()
+        if self.path:
+            blobs.discard(self.path)
+            self.path = None
+
+    def _check_head(self) -> bytes:
+        head, self._head = self._head, None
+        if not matches_extension(head, self.extension):
+            self._abort(UnsupportedMediaType(gettext("item_image_content_mismatch").format(self.extension)))
+        return head
+
+    def _abort(self, error: Exception) -> None:
+        self.close()
+        raise error
+
+
+class StreamingRequest(Request):
+    """
+    Keeps every stream it hands to the parser: `files` only exists once the whole body has
+    parsed, so when a later part aborts, the earlier parts' temporary files are reachable
+    from here alone. They are discarded as soon as parsing fails and again when the request
+    closes; claimed ones are left to their claimant.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_streams = []
+
+    @property
+    def max_content_length(self):
+        config = current_app.config
+        if self.endpoint == BATCH_ENDPOINT:
+            return config["UPLOADED_IMAGES_MAX_BATCH"] * config["UPLOADED_IMAGES_MAX_BYTES"] + MULTIPART_OVERHEAD
+        return config["MAX_CONTENT_LENGTH"]
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        stream = ImageUploadStream(blobs.get_root(), filename, current_app.config.get("UPLOADED_IMAGES_MAX_BYTES"))
+        self.upload_streams.append(stream)
+        return stream
+
+    def _load_form_data(self):
+        try:
+            super()._load_form_data()
+        except:
+            self._discard_uploads()
+            raise
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._discard_uploads()
+
+    def _discard_uploads(self) -> None:
+        streams, self.upload_streams = self.upload_streams, []
+        for stream in streams:
+            stream.close()
+
+
+def spool(image: FileStorage) -> Tuple[str, str]:
+    """
+    The hex sha256 of an upload and a temporary file in the blob folder holding it.
+    Streamed uploads already are one; anything else is copied there chunk by chunk.
+    """
+    if isinstance(image.stream, ImageUploadStream):
+        return image.stream.hexdigest(), image.stream.claim()
+
+    root = blobs.get_root()
+    os.makedirs(root, exist_ok=True)
+    digest = hashlib.sha256()
+    descriptor, temporary = tempfile.mkstemp(suffix=".tmp", dir=root)
+    try:
+        with os.fdopen(descriptor, "wb") as target:
+            for chunk in iter(lambda: image.stream.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                target.write(chunk)
+    except:
+        blobs.discard(temporary)
+        raise
+    return digest.hexdigest(), temporary
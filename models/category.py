@@ -1,9 +1,12 @@
 from db import db
 
 from uuid import uuid1
+from sqlalchemy import func
 from sqlalchemy.dialects.postgresql import UUID
 from typing import List
 
+from models.item import ItemModel
+
 class Category(db.Model):
     __tablename__ = 'category'
     
@@ -28,6 +31,25 @@ class Category(db.Model):
     @classmethod
     def find_all(cls) -> List["Category"]:
         return cls.query.all()
+    
+    @classmethod
+    def find_all_with_item_counts(cls) -> List["Category"]:
+        """
+        Every category with item_count filled in, from one GROUP BY query
+        """
+        categories = []
+        for category, item_count in db.session.query(cls, func.count(ItemModel.id)). \
+                outerjoin(ItemModel, ItemModel.category_id == cls.id).group_by(cls.id).order_by(cls.name).all():
+            category.item_count = item_count
+            categories.append(category)
+        return categories
+    
+    def count_items(self) -> int:
+        return db.session.query(func.count(ItemModel.id)).filter(ItemModel.category_id == self.id).scalar()
+    
+    @classmethod
+    def find_all_names(cls) -> List[tuple]:
+        return db.session.query(cls.id, cls.name).all()
         
     def save_to_db(self) -> None:
         db.session.add(self)
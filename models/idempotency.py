@@ -0,0 +1,75 @@
+from db import db
+
+import json
+from time import time
+from sqlalchemy.exc import IntegrityError
+
+IDEMPOTENCY_KEY_EXPIRATION_DELTA = 86400 #1 day
+IDEMPOTENCY_KEY_LEASE = 60 #a claim without a response after this long was abandoned by its request
+
+
+class IdempotencyKeyModel(db.Model):
+    __tablename__ = 'idempotencykey'
+    
+    key = db.Column(db.String(64), primary_key=True)
+    status_code = db.Column(db.Integer) #stays empty while the first request is still running
+    response = db.Column(db.Text)
+    expire_at = db.Column(db.Integer, nullable=False, index=True) #end of the claim's lease until a response is stored
+    
+    def __init__(self, key: str, **kwargs):
+        super().__init__(**kwargs)
+        self.key = key
+        self.expire_at = int(time()) + IDEMPOTENCY_KEY_LEASE
+    
+    @classmethod
+    def find_by_key(cls, key: str) -> "IdempotencyKeyModel":
+        return cls.query.filter(cls.key == key, cls.expire_at > int(time())).first()
+    
+    @classmethod
+    def claim(cls, key: str) -> "IdempotencyKeyModel":
+        """
+        Reserves the key for the current request. Returns None when another request
+        already holds it. Expired keys and claims left past their lease by a crashed
+        request are taken over.
+        """
+        record = cls(key)
+        try:
+            cls.query.filter(cls.key == key, cls.expire_at <= int(time())).delete(synchronize_session=False)
+            db.session.add(record)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return None
+        return record
+    
+    @classmethod
+    def release(cls, key: str) -> None:
+        """
+        Drops a claim that never got a response, so a retry runs the request again
+        """
+        cls.query.filter(cls.key == key, cls.status_code.is_(None)).delete(synchronize_session=False)
+        db.session.commit()
+    
+    @classmethod
+    def purge_expired(cls) -> int:
+        purged = cls.query.filter(cls.expire_at <= int(time())).delete(synchronize_session=False)
+        db.session.commit()
+        return purged
+    
+    @property
+    def body(self):
+        return json.loads(self.response)
+    
+    def store_response(self, body, status_code: int) -> None:
+        self.response = json.dumps(body)
+        self.status_code = int(status_code)
+        self.expire_at = int(time()) + IDEMPOTENCY_KEY_EXPIRATION_DELTA
+        self.save_to_db()
+        
+    def save_to_db(self) -> None:
+        db.session.add(self)
+        db.session.commit()
+    
+    def delete_from_db(self) -> None:
+        db.session.delete(self)
+        db.session.commit()
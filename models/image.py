@@ -1,13 +1,102 @@
 from db import db
 
+from collections import Counter
 from uuid import uuid1
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import case
+from sqlalchemy.dialects.postgresql import UUID, insert
+from typing import Iterable, List, Tuple
+
+
+class ImageBlobModel(db.Model):
+    """
+    One stored image file, named by the sha256 of its bytes and shared by every image row
+    that uploaded the same content. A blob whose ref_count drops to 0 has had its files
+    removed; its row is kept and revived by the next upload of the same content.
+    """
+    __tablename__ = 'image_blob'
+    hash = db.Column(db.String(64), primary_key=True)
+    extension = db.Column(db.String(10), nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    renditions_ready = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    
+    @property
+    def name(self) -> str:
+        return self.hash + self.extension
+    
+    @classmethod
+    def acquire(cls, blob_hash: str, extension: str) -> Tuple[str, bool]:
+        """
+        Adds a reference to the blob, creating or reviving its row, and returns the blob's
+        file name and whether its file has to be written. The row stays locked until the
+        caller commits, so a concurrent release cannot remove the file in between.
+        """
+        table = cls.__table__
+        revive = {
+            "ref_count": table.c.ref_count + 1,
+            "extension": case([(table.c.ref_count > 0, table.c.extension)], else_=extension),
+            "renditions_ready": db.and_(table.c.renditions_ready, table.c.ref_count > 0)
+        }
+        if db.session.get_bind().dialect.name == "postgresql":
+            statement = insert(table).values(hash=blob_hash, extension=extension, ref_count=1, renditions_ready=False)
+            statement = statement.on_conflict_do_update(index_elements=[table.c.hash], set_=revive). \
+                returning(table.c.extension, table.c.ref_count)
+            extension, ref_count = db.session.execute(statement).first()
+        else:
+            #no upsert with RETURNING (SQLite test runs); the update takes the write lock first
+            if not db.session.execute(table.update().where(table.c.hash == blob_hash).values(**revive)).rowcount:
+                db.session.execute(table.insert().values(hash=blob_hash, extension=extension, ref_count=1, renditions_ready=False))
+            extension, ref_count = db.session.execute(
+                db.select([table.c.extension, table.c.ref_count]).where(table.c.hash == blob_hash)
+            ).first()
+        return blob_hash + extension, ref_count == 1
+    
+    @classmethod
+    def release(cls, blob_hashes: Iterable[str]) -> List[str]:
+        """
+        Drops one reference per hash and returns the file names of the blobs left unreferenced.
+        Rows are updated in hash order and stay locked until the caller commits.
+        Nothing is committed here; the caller commits, then passes the names to blobs.remove.
+        """
+        table = cls.__table__
+        returning = db.session.get_bind().dialect.name == "postgresql"
+        released = []
+        for blob_hash, count in sorted(Counter(blob_hashes).items()):
+            statement = table.update().where(table.c.hash == blob_hash).values(ref_count=table.c.ref_count - count)
+            if returning:
+                row = db.session.execute(statement.returning(table.c.extension, table.c.ref_count)).first()
+            else:
+                db.session.execute(statement)
+                row = db.session.execute(
+                    db.select([table.c.extension, table.c.ref_count]).where(table.c.hash == blob_hash)
+                ).first()
+            if row and row.ref_count <= 0:
+                released.append(blob_hash + row.extension)
+        return released
+    
+    @classmethod
+    def lock_unreferenced(cls, blob_hashes: List[str]) -> List[str]:
+        """
+        Locks the rows of the blobs among blob_hashes that are still unreferenced and returns
+        their hashes. A concurrent acquire waits for the caller to commit, and one that
+        committed first has made its blob referenced again, so it is not returned.
+        """
+        return [blob_hash for blob_hash, in db.session.query(cls.hash).
+                filter(cls.hash.in_(blob_hashes), cls.ref_count <= 0).
+                order_by(cls.hash).with_for_update().all()]
+    
+    @classmethod
+    def mark_renditions_ready(cls, blob_hash: str) -> None:
+        cls.query.filter_by(hash=blob_hash).update({cls.renditions_ready: True}, synchronize_session=False)
+        db.session.commit()
 
 
 class ImageModel(db.Model):
     __tablename__ = 'image'
     id = db.Column(UUID(as_uuid=False), primary_key=True)
     name = db.Column(db.String(50), nullable=False, unique=True)
+    renditions_ready = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false()) #images stored before blobs
+    blob_hash = db.Column(db.String(64), db.ForeignKey("image_blob.hash"), index=True)
+    blob = db.relationship("ImageBlobModel")
     
     item_id = db.Column(UUID(as_uuid=True), db.ForeignKey("item.id"), nullable=False)
     
@@ -20,6 +109,20 @@ class ImageModel(db.Model):
     @classmethod
     def find_by_name(cls, name: str) -> "ImageModel":
         return cls.query.filter_by(name=name).first()
+    
+    @classmethod
+    def find_by_item_and_name(cls, item_id: str, name: str) -> "ImageModel":
+        return cls.query.filter_by(item_id=item_id, name=name).first()
+    
+    @classmethod
+    def find_blob_hashes(cls, item_id: str) -> List[str]:
+        return [blob_hash for blob_hash, in db.session.query(cls.blob_hash). \
+                filter(cls.item_id == item_id, cls.blob_hash.isnot(None)).all()]
+        
+    @classmethod
+    def save_all_to_db(cls, images: List["ImageModel"]) -> None:
+        db.session.add_all(images)
+        db.session.commit()
         
     def save_to_db(self) -> None:
         db.session.add(self)
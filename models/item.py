@@ -1,11 +1,27 @@
 from db import db
 
 from flask_sqlalchemy import Pagination
-from uuid import uuid4
+from uuid import uuid4, UUID as UUIDValue
+from datetime import datetime
+from typing import Dict, FrozenSet, List, Optional, Union
 from sqlalchemy import or_, asc, desc, and_
 from sqlalchemy.dialects.postgresql import UUID
+from marshmallow import ValidationError
 
-from models.image import ImageModel
+from libs import search
+from libs.fieldsets import project
+from libs.keyset import KeysetPagination, paginate
+from models.image import ImageModel, ImageBlobModel
+
+KEYSET_COLUMNS = {
+    "created_at": ("created_at", "id"),
+    "name": ("name", "id")
+}
+
+FIELD_COLUMNS = {
+    "image_url": ("id", "supplier_id"),
+    "image_renditions": ("id", "supplier_id")
+}
 
 
 class TimeMixin(object):
@@ -34,6 +50,11 @@ class SharedItemModel(db.Model, TimeMixin):
 
 class ItemModel(db.Model, TimeMixin):
     __tablename__ = 'item'
+    __table_args__ = (
+        db.Index("ix_item_supplier_created_at", "supplier_id", "created_at", "id"), #keyset pagination of item listings
+        db.Index("ix_item_created_at", "created_at", "id"),
+        db.Index("ix_item_category_created_at", "category_id", "created_at", "id"),
+    )
     
     id = db.Column(UUID(as_uuid=False), primary_key=True)
     name = db.Column(db.String(120), nullable=False, unique=True)
@@ -64,35 +85,167 @@ class ItemModel(db.Model, TimeMixin):
     @classmethod
     def find_by_id(cls, _id: str) -> "ItemModel":
         return cls.query.filter_by(id=_id).first()
+    
+    @classmethod
+    def find_updated_at_by_name(cls, name: str) -> Optional[datetime]:
+        return db.session.query(cls.updated_at).filter_by(name=name).scalar()
+        
+    @classmethod
+    def find_by_ids(cls, ids: List[str]) -> Dict[str, "ItemModel"]:
+        """
+        Fetches every requested item with a single IN query, keyed by the id as it was requested.
+        Malformed ids are left out, so callers treat them like ids that do not exist.
+        """
+        hexes = {}
+        for _id in ids:
+            try:
+                hexes[_id] = UUIDValue(str(_id)).hex
+            except ValueError:
+                continue
+        if not hexes:
+            return {}
+        found = {UUIDValue(str(item.id)).hex: item for item in cls.query.filter(cls.id.in_(list(hexes.values()))).all()}
+        return {_id: found[_hex] for _id, _hex in hexes.items() if _hex in found}
         
     @classmethod
     def find_by_name(cls, name: str) -> "ItemModel":
         return cls.query.filter_by(name=name).first()
-        
+    
     @classmethod
-    def find_by_supplier(cls, supplier_id: str, page: int, per_page: int, sort: str, order: str) -> "Pagination":
-        
-        if order == 'asc':
-            sort_logic = asc(getattr(cls, sort))
+    def load_image_names(cls, items: List["ItemModel"]) -> None:
+        """
+        Fills image_names, and rendition_names with the images whose renditions are ready,
+        on every item of a page with one query, instead of one item_images query per item.
+        Entries are (name, blob name) pairs; the blob name is None for images stored
+        in the item's folder before content-addressed blobs.
+        """
+        pending = [item for item in items if "image_names" not in item.__dict__]
+        if not pending:
+            return
+        names, ready = {}, {}
+        rows = db.session.query(ImageModel.item_id, ImageModel.name, ImageModel.renditions_ready, 
+                                ImageBlobModel.hash, ImageBlobModel.extension, ImageBlobModel.renditions_ready). \
+            outerjoin(ImageBlobModel, ImageModel.blob_hash == ImageBlobModel.hash). \
+            filter(ImageModel.item_id.in_([item.id for item in pending])).all()
+        for item_id, name, renditions_ready, blob_hash, extension, blob_ready in rows:
+            key = UUIDValue(str(item_id)).hex
+            entry = (name, blob_hash + extension if blob_hash else None)
+            names.setdefault(key, []).append(entry)
+            if (blob_ready if blob_hash else renditions_ready):
+                ready.setdefault(key, []).append(entry)
+        for item in pending:
+            key = UUIDValue(str(item.id)).hex
+            item.image_names = names.get(key, [])
+            item.rendition_names = ready.get(key, [])
+    
+    @classmethod
+    def add_images(cls, _id: str, count: int) -> int:
+        """
+        Counts `count` new images on the item with a single update and returns the file number
+        of the first one. The row stays locked until the caller commits, so concurrent uploads
+        never get the same numbers. Nothing is committed here.
+        """
+        table = cls.__table__
+        statement = table.update().where(table.c.id == _id). \
+            values(image_count=table.c.image_count + count, file_image_count=table.c.file_image_count + count)
+        if db.session.get_bind().dialect.name == "postgresql":
+            file_image_count, = db.session.execute(statement.returning(table.c.file_image_count)).first()
         else:
-            sort_logic = desc(getattr(cls, sort))
-            
-        return cls.query.filter_by(supplier_id=supplier_id, quantity>0). \
-            order_by(sort_logic).paginate(page=page, per_page=per_page)
+            db.session.execute(statement)
+            file_image_count, = db.session.execute(
+                db.select([table.c.file_image_count]).where(table.c.id == _id)
+            ).first()
+        return file_image_count - count + 1
+    
+    @classmethod
+    def touch_by_blob(cls, blob_hash: str) -> List[str]:
+        """
+        Bumps updated_at on every item showing the blob, so their ETags change along with
+        what they serialize, and returns the supplier ids of those items. Nothing is committed here.
+        """
+        item_ids = db.session.query(ImageModel.item_id).filter(ImageModel.blob_hash == blob_hash)
+        supplier_ids = [str(supplier_id) for supplier_id, in 
+                        db.session.query(cls.supplier_id).filter(cls.id.in_(item_ids)).distinct().all()]
+        cls.query.filter(cls.id.in_(item_ids)).update({cls.updated_at: db.func.now()}, synchronize_session=False)
+        return supplier_ids
+    
+    @classmethod
+    def find_all_names(cls) -> List[tuple]:
+        return db.session.query(cls.id, cls.name).all()
     
     @classmethod
-    def find_all(cls, keyword: str, page: int, per_page: int, sort: str, order: str) -> "Pagination":
-        keyword = "%{}%".format(keyword)
+    def reserve_stock(cls, quantities: Dict[str, int]) -> List[Dict]:
+        """
+        Takes stock out with conditional decrements (quantity >= count) so concurrent
+        checkouts can never oversell. Rows are touched in id order, which keeps the row
+        locks of competing transactions in the same sequence and rules out deadlocks.
+        Every item is tried so all shortfalls are reported at once; if there is any,
+        the whole reservation is rolled back and the shortfalls are returned.
+        Nothing is committed here, the caller commits along with the order.
+        """
+        short_counts = {}
+        for _id in sorted(quantities, key=lambda _id: UUIDValue(_id).hex):
+            count = quantities[_id]
+            reserved = cls.query.filter(cls.id == _id, cls.quantity >= count). \
+                update({cls.quantity: cls.quantity - count}, synchronize_session=False)
+            if not reserved:
+                short_counts[_id] = count
         
-        if order == 'asc':
-            sort_logic = asc(getattr(cls, sort))
-        else:
-            sort_logic = desc(getattr(cls, sort))
-            
-        return cls.query.filter(
-            and_(or_(cls.name.ilike(keyword), 
-                cls.description.ilike(keyword)), quantity>0)). \
-                    order_by(sort_logic).paginate(page=page, per_page=per_page)
+        if not short_counts:
+            return []
+        
+        db.session.rollback()
+        remaining = {UUIDValue(_id).hex: (name, quantity) for _id, name, quantity in 
+                     db.session.query(cls.id, cls.name, cls.quantity).filter(cls.id.in_(list(short_counts))).all()}
+        shortfalls = []
+        for _id, count in short_counts.items():
+            name, quantity = remaining.get(UUIDValue(_id).hex, (None, 0))
+            shortfalls.append({"item_id": _id, "name": name, "requested": count, "remaining": quantity})
+        return shortfalls
+    
+    @classmethod
+    def release_stock(cls, quantities: Dict[str, int]) -> None:
+        """
+        Puts stock back with set-based increments, in the same id order as reserve_stock.
+        Nothing is committed here.
+        """
+        for _id in sorted(quantities, key=lambda _id: UUIDValue(str(_id)).hex):
+            cls.query.filter(cls.id == _id). \
+                update({cls.quantity: cls.quantity + quantities[_id]}, synchronize_session=False)
+        
+    @classmethod
+    def _search(cls, query, keyword: str, page: int, per_page: int, sort: str, order: str, 
+                cursor: str = None, count: str = "exact", fieldset: FrozenSet[str] = None) -> Union["Pagination", KeysetPagination]:
+        query, rank = search.apply_search(query, cls, keyword)
+        if fieldset:
+            query = project(query, cls, fieldset, ["id", *KEYSET_COLUMNS.get(sort, ("created_at",))], FIELD_COLUMNS)
+        if sort == "relevance":
+            if rank is not None:
+                if cursor is not None:
+                    #ranks are computed per query, so there is no stable keyset to resume from
+                    raise ValidationError({"cursor": ["Cursors are not supported with sort=relevance."]})
+                return paginate(query, [rank, cls.id], page, per_page, "desc", None, count)
+            sort = "created_at"
+        columns = [getattr(cls, name) for name in KEYSET_COLUMNS[sort]]
+        return paginate(query, columns, page, per_page, order, cursor, count)
+    
+    @classmethod
+    def find_by_supplier(cls, supplier_id: str, keyword: str, page: int, per_page: int, sort: str, order: str, 
+                         cursor: str = None, count: str = "exact", fieldset: FrozenSet[str] = None) -> Union["Pagination", KeysetPagination]:
+        query = cls.query.filter(cls.supplier_id == supplier_id, cls.quantity > 0)
+        return cls._search(query, keyword, page, per_page, sort, order, cursor, count, fieldset)
+    
+    @classmethod
+    def find_by_category(cls, category_id: str, keyword: str, page: int, per_page: int, sort: str, order: str, 
+                         cursor: str = None, count: str = "exact", fieldset: FrozenSet[str] = None) -> Union["Pagination", KeysetPagination]:
+        query = cls.query.filter(cls.category_id == category_id, cls.quantity > 0)
+        return cls._search(query, keyword, page, per_page, sort, order, cursor, count, fieldset)
+    
+    @classmethod
+    def find_all(cls, keyword: str, page: int, per_page: int, sort: str, order: str, 
+                 cursor: str = None, count: str = "exact", fieldset: FrozenSet[str] = None) -> Union["Pagination", KeysetPagination]:
+        query = cls.query.filter(cls.quantity > 0)
+        return cls._search(query, keyword, page, per_page, sort, order, cursor, count, fieldset)
         
     def save_to_db(self) -> None:
         db.session.add(self)
@@ -100,5 +253,7 @@ class ItemModel(db.Model, TimeMixin):
     
     def delete_from_db(self) -> None:
         db.session.delete(self)
-        db.session.commit()    
-    
+        db.session.commit()
+
+
+search.install(ItemModel.__table__)
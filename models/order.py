@@ -4,17 +4,31 @@ from db import db
 
 from flask_sqlalchemy import Pagination
 from uuid import uuid4
-from sqlalchemy import asc, desc, or_
+from sqlalchemy import asc, desc, or_, func
 from sqlalchemy.dialects.postgresql import UUID
+from collections import Counter
+from datetime import datetime
 from time import time
-from typing import List
+from typing import FrozenSet, List, Optional, Set, Tuple, Union
+
+from libs.fieldsets import project
+from libs.keyset import KeysetPagination, paginate
+from models.item import ItemModel
 
 EXPIRATION_TIME_DELTA = 172800 #2 days
 
+KEYSET_COLUMNS = {
+    "created_at": ("created_at", "id"),
+    "status": ("status", "created_at", "id")
+}
+
+CANCELLABLE_STATUSES = ("pending", "unpaid")
+
 CURRENCY = "naira"
 
 class TimeMixin(object):
     created_at = db.Column(db.DateTime(), server_default=db.func.now())
+    updated_at = db.Column(db.DateTime(), nullable=False, server_default=db.func.now(), onupdate=db.func.now())
     
 
 class ItemsInOrder(db.Model):
@@ -40,11 +54,9 @@ class ItemsInOrder(db.Model):
     
     def set_amount(self) -> int:
         self.amount = int(self.quantity * (self.item.price * 100)) #returns initial amount in kobo of an item before margin is added
-        self.save_to_db()
     
     def set_total_amount(self) -> int:
         self.total_amount = int(self.quantity * ((self.item.price * 100) + self.margin)) #returns total amount in kobo of the item after the margin is added
-        self.save_to_db()
       
     def save_to_db(self) -> None:
         db.session.add(self)
@@ -56,12 +68,18 @@ class ItemsInOrder(db.Model):
 
 class OrderModel(db.Model, TimeMixin):
     __tablename__ = 'order'
+    __table_args__ = (
+        db.Index("ix_order_status_expire_at", "status", "expire_at"), #keeps the expired-orders sweep an index range scan
+        db.Index("ix_order_supplier_created_at", "supplier_id", "created_at", "id"), #keyset pagination of order listings
+        db.Index("ix_order_supplier_status", "supplier_id", "status", "created_at", "id"),
+        db.Index("ix_order_reseller_created_at", "reseller_id", "created_at", "id"),
+    )
     
     id = db.Column(UUID(as_uuid=False), primary_key=True)
     reseller_amount = db.Column(db.Integer)
     supplier_amount = db.Column(db.Integer)
     status = db.Column(db.String(15), nullable=False)
-    expire_at = db.Column(db.Integer, nullable=False, default=int(time())+EXPIRATION_TIME_DELTA)
+    expire_at = db.Column(db.Integer, nullable=False, default=lambda: int(time())+EXPIRATION_TIME_DELTA)
      
     supplier_id = db.Column(UUID(as_uuid=True), db.ForeignKey("supplier.id"))
     reseller_id = db.Column(UUID(as_uuid=True), db.ForeignKey("reseller.id"))
@@ -112,29 +130,36 @@ class OrderModel(db.Model, TimeMixin):
     
     
     @classmethod
-    def find_by_supplier_id(cls, supplier_id: str, page: int, per_page: int, sort: str, order: str) -> "Pagination":
-        
-        if order == 'asc':
-            sort_logic = asc(getattr(cls, sort))
-        else:
-            sort_logic = desc(getattr(cls, sort))
-            
-        return cls.query.filter_by(supplier_id=supplier_id). \
-            order_by(sort_logic).paginate(page=page, per_page=per_page)
+    def find_by_supplier_id(cls, supplier_id: str, page: int, per_page: int, sort: str, order: str, 
+                            cursor: str = None, count: str = "exact", fieldset: FrozenSet[str] = None) -> Union["Pagination", KeysetPagination]:
+        return cls._paginate(cls.query.filter_by(supplier_id=supplier_id), page, per_page, sort, order, cursor, count, fieldset)
             
     
     @classmethod
-    def find_by_reseller_id(cls, reseller_id: str, page: int, per_page: int, sort: str, order: str) -> "Pagination":
-        
-        if order == 'asc':
-            sort_logic = asc(getattr(cls, sort))
-        else:
-            sort_logic = desc(getattr(cls, sort))
-            
-        return cls.query.filter_by(reseller_id=reseller_id). \
-            order_by(sort_logic).paginate(page=page, per_page=per_page)
+    def find_by_reseller_id(cls, reseller_id: str, page: int, per_page: int, sort: str, order: str, 
+                            cursor: str = None, count: str = "exact", fieldset: FrozenSet[str] = None) -> Union["Pagination", KeysetPagination]:
+        return cls._paginate(cls.query.filter_by(reseller_id=reseller_id), page, per_page, sort, order, cursor, count, fieldset)
+    
+    @classmethod
+    def _paginate(cls, query, page: int, per_page: int, sort: str, order: str, 
+                  cursor: str, count: str, fieldset: Optional[FrozenSet[str]]) -> Union["Pagination", KeysetPagination]:
+        if fieldset:
+            query = project(query, cls, fieldset, ["id", *KEYSET_COLUMNS[sort]], {})
+        columns = [getattr(cls, name) for name in KEYSET_COLUMNS[sort]]
+        return paginate(query, columns, page, per_page, order, cursor, count)
  
     
+    @classmethod
+    def find_list_version(cls, **filters) -> Tuple[int, Optional[datetime]]:
+        """
+        Row count and latest updated_at of the orders matching filters, for conditional GETs
+        """
+        return db.session.query(func.count(cls.id), func.max(cls.updated_at)).filter_by(**filters).one()
+    
+    @classmethod
+    def find_updated_at(cls, _id: str) -> Optional[datetime]:
+        return db.session.query(cls.updated_at).filter_by(id=_id).scalar()
+    
     @property
     def expired(self) -> bool:
         return time() > self.expire_at
@@ -147,15 +172,83 @@ class OrderModel(db.Model, TimeMixin):
     
     def set_reseller_amount(self) -> None:
         self.reseller_amount = int(sum([itemdata.total_amount for itemdata in self.items]))
-        self.save_to_db()
         
     def set_supplier_amount(self) -> None:
         self.supplier_amount = int(sum([itemdata.amount for itemdata in self.items]))
-        self.save_to_db()
         
     @classmethod
     def find_by_id(cls, _id: str) -> "OrderModel":
         return cls.query.filter_by(id=_id).first()
+    
+    @property
+    def item_quantities(self) -> Counter:
+        quantities = Counter()
+        for itemdata in self.items:
+            quantities[str(itemdata.item_id)] += itemdata.quantity
+        return quantities
+    
+    def cancel(self) -> bool:
+        """
+        Cancels a pending or unpaid order and restocks its items in one transaction.
+        The status change is conditional, so two concurrent cancellations restock only once.
+        Returns False when the order was no longer cancellable.
+        """
+        quantities = self.item_quantities
+        try:
+            cancelled = OrderModel.query.filter(OrderModel.id == self.id, OrderModel.status.in_(CANCELLABLE_STATUSES)). \
+                update({OrderModel.status: "cancelled", OrderModel.updated_at: func.now()}, synchronize_session=False)
+            if cancelled:
+                ItemModel.release_stock(quantities)
+            db.session.commit()
+        except:
+            db.session.rollback()
+            raise
+        return bool(cancelled)
+    
+    @classmethod
+    def cancel_expired(cls, batch_size: int = 500) -> Tuple[int, Set[str]]:
+        """
+        Cancels up to batch_size orders that are past expire_at and still unpaid, and
+        restocks their items, with set-based statements in one transaction.
+        Rows already locked by another sweeper or a payment are skipped.
+        Returns the number of orders cancelled and the ids of the suppliers whose stock changed.
+        """
+        now = int(time())
+        try:
+            order_ids = [_id for _id, in db.session.query(cls.id).
+                         filter(cls.status.in_(CANCELLABLE_STATUSES), cls.expire_at < now).
+                         order_by(cls.expire_at).limit(batch_size).
+                         with_for_update(skip_locked=True).all()]
+            if not order_ids:
+                db.session.rollback()
+                return 0, set()
+            
+            quantities = dict(db.session.query(ItemsInOrder.item_id, func.sum(ItemsInOrder.quantity)).
+                              filter(ItemsInOrder.order_id.in_(order_ids)).
+                              group_by(ItemsInOrder.item_id).all())
+            cls.query.filter(cls.id.in_(order_ids)). \
+                update({cls.status: "cancelled", cls.updated_at: func.now()}, synchronize_session=False)
+            supplier_ids = {str(supplier_id) for supplier_id, in db.session.query(ItemModel.supplier_id).
+                            filter(ItemModel.id.in_(list(quantities))).distinct()}
+            ItemModel.release_stock(quantities)
+            db.session.commit()
+        except:
+            db.session.rollback()
+            raise
+        return len(order_ids), supplier_ids
+    
+    def save_with_payment(self, payment: "PaymentModel") -> None:
+        """
+        Writes the order, its lines, its buyer and the payment in one transaction,
+        so checkout costs a single commit however many lines the cart has.
+        """
+        try:
+            db.session.add(self)
+            db.session.add(payment)
+            db.session.commit()
+        except:
+            db.session.rollback()
+            raise
         
     def save_to_db(self) -> None:
         db.session.add(self)
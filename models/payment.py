@@ -1,7 +1,15 @@
 from db import db
+import logging
 from uuid import uuid1
 
 from sqlalchemy.dialects.postgresql import UUID
+from typing import Dict, List
+
+from models.order import OrderModel, CANCELLABLE_STATUSES
+
+ORDER_STATUS_FOR_CHARGE = {"success": "paid", "failed": "unpaid"} #final Paystack charge statuses
+
+logger = logging.getLogger(__name__)
 
 class TimeMixin(object):
     created_at = db.Column(db.DateTime(), server_default=db.func.now())
@@ -10,9 +18,11 @@ class TimeMixin(object):
 class PaymentModel(db.Model, TimeMixin):
     __tablename__ = 'payment'
     
-    id = db.Column(UUID(as_uuid=False), primary_key=True, default=uuid1().hex)
+    id = db.Column(UUID(as_uuid=False), primary_key=True, default=lambda: uuid1().hex)
     amount = db.Column(db.Float(precision=2), nullable=False)
-    reference = db.Column(db.String(100))
+    reference = db.Column(db.String(100), index=True)
+    status = db.Column(db.String(15)) #final charge status from Paystack, empty while unknown
+    refund_due = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false()) #charged after its order was cancelled
     
     order_id = db.Column(UUID(as_uuid=False), db.ForeignKey("order.id"), nullable=False)
 
@@ -24,6 +34,92 @@ class PaymentModel(db.Model, TimeMixin):
     def find_by_reference(cls, reference: str) -> "PaymentModel":
         return cls.query.filter_by(reference=reference).first()
     
+    @classmethod
+    def find_unreconciled_references(cls, limit: int) -> List[str]:
+        """
+        References of payments with no recorded charge status whose orders are still awaiting payment
+        """
+        return [reference for reference, in db.session.query(cls.reference).
+                join(OrderModel, OrderModel.id == cls.order_id).
+                filter(OrderModel.status.in_(CANCELLABLE_STATUSES), cls.reference.isnot(None), cls.status.is_(None)).
+                order_by(cls.created_at).limit(limit).all()]
+    
+    @classmethod
+    def record_charges(cls, statuses: Dict[str, str]) -> int:
+        """
+        Bulk version of record_charge: one UPDATE for the payments and one for the orders
+        per final status, all in a single commit. Returns the number of payments updated.
+        """
+        recorded = 0
+        try:
+            for status, order_status in ORDER_STATUS_FOR_CHARGE.items():
+                references = [reference for reference, charge_status in statuses.items() if charge_status == status]
+                if not references:
+                    continue
+                order_ids = [order_id for order_id, in db.session.query(cls.order_id).
+                             filter(cls.reference.in_(references), cls.status.is_(None)).all()]
+                OrderModel.query.filter(OrderModel.id.in_(order_ids), OrderModel.status.in_(CANCELLABLE_STATUSES)). \
+                    update({OrderModel.status: order_status, OrderModel.updated_at: db.func.now()}, synchronize_session=False)
+                if status == "success":
+                    cls._flag_refunds(cls.query.filter(cls.reference.in_(references), cls.status.is_(None),
+                                                       cls.order_id.in_(order_ids)), order_status)
+                recorded += cls.query.filter(cls.reference.in_(references), cls.status.is_(None)). \
+                    update({cls.status: status}, synchronize_session=False)
+            db.session.commit()
+        except:
+            db.session.rollback()
+            raise
+        return recorded
+    
+    @classmethod
+    def _flag_refunds(cls, payments, order_status: str) -> None:
+        """
+        Marks the successful payments among `payments` whose order did not take order_status,
+        i.e. was cancelled before the charge arrived, as due for a refund
+        """
+        stranded = payments.join(OrderModel, OrderModel.id == cls.order_id). \
+            filter(OrderModel.status != order_status).with_entities(cls.id, cls.reference, cls.order_id).all()
+        if not stranded:
+            return
+        for _, reference, order_id in stranded:
+            logger.warning("Payment %s succeeded for order %s after it was cancelled; refund due", reference, order_id)
+        cls.query.filter(cls.id.in_([_id for _id, _, _ in stranded])). \
+            update({cls.refund_due: True}, synchronize_session=False)
+    
+    @classmethod
+    def record_charge_by_reference(cls, reference: str, status: str, ip_address: str = None) -> bool:
+        payment = cls.find_by_reference(reference)
+        if payment:
+            return payment.record_charge(status, ip_address)
+        return False
+    
+    def record_charge(self, status: str, ip_address: str = None) -> bool:
+        """
+        Applies a final Paystack charge status to the payment, its order and buyer in one commit.
+        The payment takes only its first final status, so a redelivered or out of order webhook
+        or a concurrent verify records the charge once. The order changes only while it is
+        still awaiting payment; a charge that succeeds after the order was cancelled, and its
+        stock released, flags the payment refund_due instead. Returns False when nothing changed.
+        """
+        if status not in ORDER_STATUS_FOR_CHARGE:
+            return False
+        order_status = ORDER_STATUS_FOR_CHARGE[status]
+        try:
+            recorded = PaymentModel.query.filter(PaymentModel.id == self.id, PaymentModel.status.is_(None)). \
+                update({PaymentModel.status: status}, synchronize_session=False)
+            if recorded:
+                applied = OrderModel.query.filter(OrderModel.id == self.order_id, OrderModel.status.in_(CANCELLABLE_STATUSES)). \
+                    update({OrderModel.status: order_status, OrderModel.updated_at: db.func.now()}, synchronize_session=False)
+                if applied and ip_address and self.order.buyer:
+                    self.order.buyer.ip_address = ip_address
+                if not applied and status == "success":
+                    PaymentModel._flag_refunds(PaymentModel.query.filter(PaymentModel.id == self.id), order_status)
+            db.session.commit()
+        except:
+            db.session.rollback()
+            raise
+        return bool(recorded)
+    
     def save_to_db(self) -> None:
         db.session.add(self)
         db.session.commit()
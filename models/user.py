@@ -3,12 +3,17 @@ from db import db
 from flask import request, url_for
 from requests import Response, post
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import validates
-from sqlalchemy import or_, and_
+from sqlalchemy.orm import validates, joinedload, noload, selectinload
+from sqlalchemy import or_, and_, desc, func
+from typing import List
 from uuid import uuid1
 
 from libs.mailgun import MailGun
 from models.confirmation import SubAdminConfirmationModel, ResellerConfirmationModel
+from models.item import ItemModel, SharedItemModel
+from models.order import OrderModel
+
+PREVIEW_SIZE = 5 #newest rows of each collection shown on a profile, the rest is on the paginated endpoints
         
   
 class TimeMixin(object):
@@ -65,6 +70,29 @@ class SupplierModel(db.Model, TimeMixin, RemoteAddressMixin):
     @classmethod
     def find_by_cacnumber(cls, cacnumber: int) -> 'SupplierModel':
         return cls.query.filter_by(cacnumber=cacnumber).first()
+    
+    @classmethod
+    def find_profile(cls, _id: str) -> 'SupplierModel':
+        return cls.query.options(joinedload(cls.bankaccount), noload(cls.orders), noload(cls.items)). \
+            filter_by(id=_id).first()
+    
+    @property
+    def order_count(self) -> int:
+        return db.session.query(func.count(OrderModel.id)).filter(OrderModel.supplier_id == self.id).scalar()
+    
+    @property
+    def recent_orders(self) -> List[OrderModel]:
+        return OrderModel.query.filter(OrderModel.supplier_id == self.id). \
+            order_by(desc(OrderModel.created_at), desc(OrderModel.id)).limit(PREVIEW_SIZE).all()
+    
+    @property
+    def item_count(self) -> int:
+        return db.session.query(func.count(ItemModel.id)).filter(ItemModel.supplier_id == self.id).scalar()
+    
+    @property
+    def recent_items(self) -> List[ItemModel]:
+        return ItemModel.query.filter(ItemModel.supplier_id == self.id). \
+            order_by(desc(ItemModel.created_at), desc(ItemModel.id)).limit(PREVIEW_SIZE).all()
 
 
     def save_to_db(self) -> None:
@@ -104,6 +132,28 @@ class ResellerModel(db.Model, TimeMixin, RemoteAddressMixin):
     def find_by_email(cls, email: str) -> "ResellerModel":
         return cls.query.filter_by(email=email).first()
     
+    @classmethod
+    def find_profile(cls, _id: str) -> "ResellerModel":
+        return cls.query.options(joinedload(cls.bankaccount), noload(cls.orders)).filter_by(id=_id).first()
+    
+    @property
+    def order_count(self) -> int:
+        return db.session.query(func.count(OrderModel.id)).filter(OrderModel.reseller_id == self.id).scalar()
+    
+    @property
+    def recent_orders(self) -> List[OrderModel]:
+        return OrderModel.query.filter(OrderModel.reseller_id == self.id). \
+            order_by(desc(OrderModel.created_at), desc(OrderModel.id)).limit(PREVIEW_SIZE).all()
+    
+    @property
+    def shareditem_count(self) -> int:
+        return self.shareditems.order_by(None).count()
+    
+    @property
+    def recent_shareditems(self) -> List[SharedItemModel]:
+        return self.shareditems.order_by(desc(SharedItemModel.created_at), desc(SharedItemModel.id)). \
+            limit(PREVIEW_SIZE).all()
+    
     @property
     def most_recent_confirmation(self) -> "ResellerConfirmationModel":
         return self.confirmations.order_by(db.desc(ResellerConfirmationModel.expire_at)).first()
@@ -128,7 +178,7 @@ class ResellerModel(db.Model, TimeMixin, RemoteAddressMixin):
 class BuyerModel(db.Model, TimeMixin, RemoteAddressMixin):
     __tablename__ = 'buyer'
 
-    id = db.Column(UUID(as_uuid=False), primary_key=True, default=uuid1().hex)
+    id = db.Column(UUID(as_uuid=False), primary_key=True, default=lambda: uuid1().hex)
     firstname = db.Column(db.String(80), nullable=False)
     lastname = db.Column(db.String(80), nullable=False)
     address = db.Column(db.Text, nullable=False)
@@ -221,6 +271,10 @@ class SubAdminModel(db.Model, TimeMixin, RemoteAddressMixin):
     def find_by_username(cls, username: str) -> "SubAdminModel":
         return cls.query.filter_by(username=username).first()
     
+    @classmethod
+    def find_profile(cls, _id: str) -> "SubAdminModel":
+        return cls.query.options(selectinload(cls.suppliers).load_only("id")).filter_by(id=_id).first()
+    
     @property
     def most_recent_confirmation(self) -> "SubAdminConfirmationModel":
         return self.confirmations.order_by(db.desc(SubAdminConfirmationModel.expire_at)).first()
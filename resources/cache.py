@@ -0,0 +1,26 @@
+import os
+from flask_restful import Resource
+from flask_jwt_extended import get_jwt_identity, jwt_required
+from http import HTTPStatus
+
+from libs.cache import cache_stats
+from libs.strings import gettext
+from models.user import SubAdminModel
+
+
+class CacheStatsResource(Resource):
+    
+    @classmethod
+    @jwt_required
+    def get(cls):
+        """
+        Hit and miss counts of the in-process tier and of the shared backend. The counters
+        belong to the worker that answers, identified by its pid; they reset when it restarts.
+        """
+        if not SubAdminModel.find_by_id(get_jwt_identity()):
+            return {"message": gettext("account_access_denied")}, HTTPStatus.FORBIDDEN
+        stats = cache_stats()
+        for tier in stats.values():
+            lookups = tier["hits"] + tier["misses"]
+            tier["hit_ratio"] = round(tier["hits"] / lookups, 3) if lookups else None
+        return {"pid": os.getpid(), **stats}, HTTPStatus.OK
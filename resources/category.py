@@ -3,7 +3,10 @@ from flask_restful import Resource, request
 from marshmallow import ValidationError
 from http import HTTPStatus
 
+from libs.cache import cached, invalidate, CATEGORIES
+from libs.conditional import conditional, namespace_version
 from libs.strings import gettext
+from libs.suggest import suggestions, publish
 
 from models.category import Category
 from schemas.category import CategorySchema
@@ -32,6 +35,8 @@ class CategoryResource(Resource):
         
         try:
             category.save_to_db()
+            invalidate(CATEGORIES)
+            publish(suggestions.add, "category", category.id, category.name)
             return {"message": gettext("category_created")}, HTTPStatus.CREATED
         except:
             traceback.print_exc()
@@ -52,7 +57,10 @@ class CategoryResource(Resource):
         category = Category.find_by_name(name)
         if category:
             try:
+                category_id, category_name = category.id, category.name
                 category.delete_from_db()
+                invalidate(CATEGORIES)
+                publish(suggestions.remove, "category", category_id, category_name)
                 return {"message": gettext("category_deleted")}, HTTPStatus.OK
             except:
                 traceback.print_exc()
@@ -62,5 +70,7 @@ class CategoryResource(Resource):
 
 class CategoryListResource(Resource):
     @classmethod
+    @conditional(lambda **kwargs: namespace_version([CATEGORIES]))
+    @cached(timeout=6 * 60 * 60, namespaces=[CATEGORIES])
     def get(cls):
-        return {"categories": category_list_schema.dump(Category.find_all())}, HTTPStatus.OK
\ No newline at end of file
+        return {"categories": category_list_schema.dump(Category.find_all_with_item_counts())}, HTTPStatus.OK
\ No newline at end of file
@@ -0,0 +1,70 @@
+import traceback, os, re
+from flask import send_file
+from flask_restful import Resource
+from http import HTTPStatus
+from webargs import fields
+from webargs.flaskparser import use_kwargs
+
+from libs import blobs, img_helper, resizer
+from libs.strings import gettext
+from models.image import ImageModel
+
+ID_PATTERN = re.compile(r"^[0-9a-fA-F-]{32,36}$")
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+RESIZE_ATTEMPTS = 3
+
+
+class ImageResizeResource(Resource):
+    
+    @classmethod
+    @use_kwargs(
+        {
+            "w": fields.Int(missing=resizer.WIDTHS[-1]),
+            "q": fields.Int(missing=resizer.DEFAULT_QUALITY)
+        }
+    )
+    def get(cls, supplier_id: str, item_id: str, name: str, w: int, q: int):
+        
+        if not (ID_PATTERN.match(supplier_id) and ID_PATTERN.match(item_id) and img_helper.is_filename_safe(name)):
+            return {"message": gettext("item_image_illegal_filename").format(name)}, HTTPStatus.BAD_REQUEST
+        
+        source_path = img_helper.get_path(name, folder=f"{supplier_id}/{item_id}")
+        if not os.path.isfile(source_path):
+            image = ImageModel.find_by_item_and_name(item_id, name)
+            if not (image and image.blob):
+                return {"message": gettext("item_image_not_found")}, HTTPStatus.NOT_FOUND
+            source_path = blobs.get_path(image.blob.name)
+        
+        for attempt in range(RESIZE_ATTEMPTS):
+            try:
+                path = resizer.get_resized(source_path, resizer.quantise_width(w), resizer.quantise_quality(q))
+                response = send_file(path, mimetype="image/webp", conditional=True)
+                break
+            except FileNotFoundError:
+                #evicted by another worker between the lookup and send_file
+                if attempt == RESIZE_ATTEMPTS - 1:
+                    traceback.print_exc()
+                    return {"message": gettext("item_image_resize_error")}, HTTPStatus.INTERNAL_SERVER_ERROR
+            except:
+                traceback.print_exc()
+                return {"message": gettext("item_image_resize_error")}, HTTPStatus.INTERNAL_SERVER_ERROR
+        
+        response.headers["Cache-Control"] = CACHE_CONTROL
+        return response
+
+
+
+class ImageBlobResource(Resource):
+    
+    @classmethod
+    def get(cls, name: str):
+        
+        if not blobs.NAME_PATTERN.match(name):
+            return {"message": gettext("item_image_illegal_filename").format(name)}, HTTPStatus.BAD_REQUEST
+        path = blobs.get_path(name)
+        if not os.path.isfile(path):
+            return {"message": gettext("item_image_not_found")}, HTTPStatus.NOT_FOUND
+        
+        response = send_file(path, conditional=True)
+        response.headers["Cache-Control"] = CACHE_CONTROL
+        return response
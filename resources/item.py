@@ -1,19 +1,26 @@
 import traceback, os
+from flask import current_app
 from flask_restful import Resource, request
 from flask_jwt_extended import get_jwt_identity, jwt_required, jwt_optional
-from flask_uploads import UploadNotAllowed
 from marshmallow import ValidationError
 from http import HTTPStatus
+from uuid import UUID as UUIDValue
 from webargs import fields
 from webargs.flaskparser import use_kwargs
 
-from extension import cache, limiter
+from db import db
+from extension import limiter
+from libs.keyset import COUNT_MODES
 from libs.strings import gettext
-from libs import img_helper
-from libs.utils import clear_cache
+from libs.suggest import suggestions, ensure_loaded, publish
+from libs import blobs, fastdump, img_helper, renditions, uploads
+from libs.cache import cached, invalidate, CATEGORIES, ITEMS, supplier_items
+from libs.conditional import conditional, namespace_version
+from libs.fieldsets import parse_fields, sparse_schema
 
+from models.category import Category
 from models.item import ItemModel, SharedItemModel
-from models.image import ImageModel
+from models.image import ImageModel, ImageBlobModel
 from models.user import SupplierModel, ResellerModel, SubAdminModel
 from schemas.item import ItemSchema, SharedItemSchema, ItemPaginationSchema, SharedItemPaginationSchema
 from schemas.image import ImageSchema, ImageModelSchema
@@ -21,10 +28,36 @@ from schemas.image import ImageSchema, ImageModelSchema
 item_schema = ItemSchema()
 item_list_schema = ItemSchema(many=True)
 item_pagination_schema = ItemPaginationSchema()
+fastdump.compile_schema(item_pagination_schema)
+ITEM_FIELDS = frozenset(item_schema.dump_fields)
 image_schema = ImageSchema()
 
 
 
+def authorize_supplier(supplier_id: str, **kwargs):
+    """
+    Error response unless the signed in subadmin manages supplier_id
+    """
+    subadmin = SubAdminModel.find_by_id(get_jwt_identity())
+    if not subadmin:
+        return {"message": gettext("user_not_found")}, HTTPStatus.NOT_FOUND
+    if supplier_id not in [supplier.id for supplier in subadmin.suppliers]:
+        return {"message": gettext("account_access_denied")}, HTTPStatus.FORBIDDEN
+    return None
+
+
+def supplier_scope(supplier_id: str, **kwargs) -> str:
+    return supplier_items(supplier_id)
+
+
+def item_version(name: str, **kwargs):
+    updated_at = ItemModel.find_updated_at_by_name(name)
+    if updated_at is None:
+        return None
+    return updated_at, updated_at
+
+
+
 """
 Item Resource is a supplier resource
 """
@@ -56,7 +89,8 @@ class SupplierItemResource(Resource):
                     
                 try:
                     item.save_to_db()
-                    clear_cache("/items")
+                    invalidate(ITEMS, CATEGORIES, supplier_items(supplier_id))
+                    publish(suggestions.add, "item", item.id, item.name)
                     return {"message": gettext("item_created")}, HTTPStatus.CREATED
                 except:
                     traceback.print_exc()
@@ -102,6 +136,7 @@ class SupplierItemResource(Resource):
                 item = ItemModel.find_by_name(name)
             
                 if item:
+                    old_name = item.name
                     item.name = item_json.get("name") or item.name
                     item.price = item_json.get("price") or item.price
                     item.description = item_json.get("description") or item.description
@@ -111,7 +146,9 @@ class SupplierItemResource(Resource):
                         
                     try:
                         item.save_to_db()
-                        clear_cache("/items")
+                        invalidate(ITEMS, supplier_items(supplier_id))
+                        if item.name != old_name:
+                            publish(suggestions.rename, "item", item.id, old_name, item.name)
                         return {"message": gettext("item_updated")}, HTTPStatus.OK
                     except:
                         traceback.print_exc()
@@ -137,10 +174,16 @@ class SupplierItemResource(Resource):
                 item = ItemModel.find_by_name(name)
                 if item:
                     try:
+                        item_id, item_name = item.id, item.name
+                        released = ImageBlobModel.release(ImageModel.find_blob_hashes(item_id))
                         item.delete_from_db()
+                        blobs.remove(released)
+                        invalidate(ITEMS, CATEGORIES, supplier_items(supplier_id))
+                        publish(suggestions.remove, "item", item_id, item_name)
                         return {"message": gettext("item_deleted")}, HTTPStatus.OK
                     except:
                         traceback.print_exc()
+                        db.session.rollback()
                         return {"message": gettext("item_delete_error")}, HTTPStatus.INTERNAL_SERVER_ERROR
         
 
@@ -156,34 +199,33 @@ class SupplierItemListResource(Resource):
             "page": fields.Int(missing=1), 
             "per_page": fields.Int(missing=10),
             "sort": fields.Str(missing="created_at"),
-            "order": fields.Str(missing="desc")
+            "order": fields.Str(missing="desc"),
+            "cursor": fields.Str(missing=None),
+            "count": fields.Str(missing="none"),
+            "fieldset": fields.Str(missing=None, data_key="fields")
         }
     )
-    @cache.cached(timeout=60, query_string=True)
-    def get(cls, supplier_id:str, keyword: str, page: int, per_page: int, sort: str, order: str):
+    @cached(timeout=300, namespaces=lambda supplier_id, **kwargs: [supplier_items(supplier_id)], 
+            authorize=authorize_supplier, scope=supplier_scope)
+    def get(cls, supplier_id:str, keyword: str, page: int, per_page: int, sort: str, order: str, cursor: str, count: str, fieldset: str):
         
-        subadmin_id = get_jwt_identity()
-        subadmin = SubAdminModel.find_by_id(subadmin_id)
-        supplier_ids = []
-        if subadmin:
-            for supplier in subadmin.suppliers:
-                supplier_ids.append(supplier.id)
-            if supplier_id not in supplier_ids:
-                return {"message": gettext("account_access_denied")}, HTTPStatus.FORBIDDEN
-    
+        #access to supplier_id has been checked by authorize_supplier before the cache lookup
+        if sort not in ['created_at', 'name', 'relevance']:
+            sort = 'created_at'
         
-            if sort not in ['created_at', 'name']:
-                sort = 'created_at'
-            
-            if order not in ['asc', 'desc']:
-                order = 'desc'
-            
-            
-            if not SupplierModel.find_by_id(supplier_id):
-                return {"message": gettext("user_not_found")}, HTTPStatus.NOT_FOUND
-            paginated_item = ItemModel.find_by_supplier(supplier_id, page, per_page, sort, order)
-            print(paginated_item.__dict__)
-            return item_pagination_schema.dump(paginated_item), HTTPStatus.OK
+        if order not in ['asc', 'desc']:
+            order = 'desc'
+        
+        if count not in COUNT_MODES:
+            count = 'none'
+        
+        fieldset = parse_fields(fieldset, ITEM_FIELDS)
+        schema = sparse_schema(ItemPaginationSchema, fieldset) if fieldset else item_pagination_schema
+        
+        if not SupplierModel.find_by_id(supplier_id):
+            return {"message": gettext("user_not_found")}, HTTPStatus.NOT_FOUND
+        paginated_item = ItemModel.find_by_supplier(supplier_id, keyword, page, per_page, sort, order, cursor, count, fieldset)
+        return fastdump.dump(schema, paginated_item), HTTPStatus.OK
             
         
     
@@ -205,31 +247,91 @@ class ItemImageUploadResource(Resource):
                 return {"message": gettext("account_access_denied")}, HTTPStatus.FORBIDDEN
             if SupplierModel.find_by_id(supplier_id):
                 item = ItemModel.find_by_name(name)
-                item.image_count += 1
-                item.file_image_count += 1
-                count = item.file_image_count
-                folder = f"{supplier_id}/{item.id}"
-                filename = f"{item.id}_{count}"
-                item_image_path = img_helper.find_image_any_format(filename, folder)
+                if not item:
+                    return {"message": gettext("item_not_found")}, HTTPStatus.NOT_FOUND
                 
-                try:
-                    extension = img_helper.get_extension(data["image"])
-                    image_name = filename + extension
-                    image_path = img_helper.save_image(data["image"], folder=folder, name=image_name)
-                    image = ImageModel(image_name, item.id)
-                    try:
-                        image.save_to_db()
-                        item.image_count = count
-                        item.save_to_db()
-                        return {"message": gettext("item_image_uploaded")}, HTTPStatus.OK
-                    except:
-                        traceback.print_exc()
-                        return {"message": gettext("item_image_save_error")}, HTTPStatus.INTERNAL_SERVER_ERROR
-                except UploadNotAllowed:
+                extension = img_helper.get_extension(data["image"])
+                if not img_helper.is_extension_allowed(data["image"]):
                     return {"message": gettext("item_image_illegal_extension").format(extension)}, HTTPStatus.BAD_REQUEST
+                blob_hash, temporary = uploads.spool(data["image"])
+                try:
+                    #same lock order as the batch upload: blob row, then item row
+                    blob_name, created = ImageBlobModel.acquire(blob_hash, extension)
+                    blob_path = blobs.store(temporary, blob_name)
+                    count = ItemModel.add_images(item.id, 1)
+                    image = ImageModel(f"{item.id}_{count}{extension}", item.id)
+                    image.blob_hash = blob_hash
+                    image.save_to_db()
+                    invalidate(ITEMS, supplier_items(supplier_id))
+                    if created:
+                        renditions.generate(blob_path, blob_hash)
+                    return {"message": gettext("item_image_uploaded")}, HTTPStatus.OK
+                except:
+                    traceback.print_exc()
+                    db.session.rollback()
+                    blobs.discard(temporary)
+                    return {"message": gettext("item_image_save_error")}, HTTPStatus.INTERNAL_SERVER_ERROR
                 
         
             
+class ItemImageBatchUploadResource(Resource):
+    
+    @classmethod
+    @jwt_required
+    def post(cls, supplier_id: str, name: str):
+        
+        denied = authorize_supplier(supplier_id)
+        if denied is not None:
+            return denied
+        supplier = SupplierModel.find_by_id(supplier_id)
+        if not supplier:
+            return {"message": gettext("user_not_found")}, HTTPStatus.NOT_FOUND
+        item = ItemModel.find_by_name(name)
+        if not item or item.supplier_id != UUIDValue(str(supplier.id)):
+            return {"message": gettext("item_not_found")}, HTTPStatus.NOT_FOUND
+        
+        images = request.files.getlist("images")
+        max_batch = current_app.config["UPLOADED_IMAGES_MAX_BATCH"]
+        if not images or len(images) > max_batch:
+            return {"message": gettext("item_image_batch_size").format(max_batch)}, HTTPStatus.BAD_REQUEST
+        for image in images:
+            if not img_helper.is_extension_allowed(image):
+                return {"message": gettext("item_image_illegal_extension").format(img_helper.get_extension(image))}, HTTPStatus.BAD_REQUEST
+        
+        spooled = []
+        try:
+            for image in images:
+                spooled.append(uploads.spool(image))
+            created = {}
+            #blob rows are locked in hash order, as in ImageBlobModel.release
+            for position in sorted(range(len(images)), key=lambda position: spooled[position][0]):
+                blob_hash, temporary = spooled[position]
+                blob_name, is_new = ImageBlobModel.acquire(blob_hash, img_helper.get_extension(images[position]))
+                blob_path = blobs.store(temporary, blob_name)
+                if is_new:
+                    created[blob_hash] = blob_path
+            first = ItemModel.add_images(item.id, len(images))
+            records = []
+            for position, (image, (blob_hash, _)) in enumerate(zip(images, spooled)):
+                record = ImageModel(f"{item.id}_{first + position}{img_helper.get_extension(image)}", item.id)
+                record.blob_hash = blob_hash
+                records.append(record)
+            ImageModel.save_all_to_db(records)
+        except:
+            traceback.print_exc()
+            db.session.rollback() #releases the item and blob row locks right away
+            for _, temporary in spooled:
+                blobs.discard(temporary)
+            return {"message": gettext("item_image_save_error")}, HTTPStatus.INTERNAL_SERVER_ERROR
+        
+        invalidate(ITEMS, supplier_items(supplier_id))
+        for blob_hash, blob_path in created.items():
+            renditions.generate(blob_path, blob_hash)
+        return {"message": gettext("item_images_uploaded").format(len(records)), 
+                "images": [record.name for record in records]}, HTTPStatus.OK
+        
+        
+
 class ItemImageDeleteResource(Resource):
     
     @classmethod
@@ -252,14 +354,21 @@ class ItemImageDeleteResource(Resource):
                     return {"message": gettext("item_image_illegal_filename").format(filename)}, HTTPStatus.BAD_REQUEST
                 try:
                     item = ItemModel.find_by_id(str(item_id))
-                    os.remove(img_helper.get_path(filename, folder=folder))
+                    released = []
+                    if image.blob_hash:
+                        released = ImageBlobModel.release([image.blob_hash])
+                    else:
+                        os.remove(img_helper.get_path(filename, folder=folder))
+                        renditions.remove(img_helper.get_path(filename, folder=folder))
                     item.image_count -= 1
                     try:
-                        item.save_to_db()
-                        image.delete_from_db()
+                        image.delete_from_db() #commits the count and the release with it
                     except:
                         traceback.print_exc()
+                        db.session.rollback()
                         return {"message": gettext("item_update_error")}, HTTPStatus.INTERNAL_SERVER_ERROR
+                    blobs.remove(released)
+                    invalidate(ITEMS, supplier_items(supplier_id))
                     return {"message": gettext("item_image_deleted")}, HTTPStatus.OK
                 except FileNotFoundError:
                     return {"message": gettext("item_image_not_found")}, HTTPStatus.NOT_FOUND
@@ -277,6 +386,7 @@ class ResellerItemResource(Resource):
     
     @classmethod
     @jwt_optional
+    @conditional(item_version)
     def get(cls, name: str):
         
         item = ItemModel.find_by_name(name)
@@ -297,23 +407,93 @@ class ResellerItemListResource(Resource):
             "page": fields.Int(missing=1), 
             "per_page": fields.Int(missing=10),
             "sort": fields.Str(missing="created_at"),
-            "order": fields.Str(missing="desc")
+            "order": fields.Str(missing="desc"),
+            "cursor": fields.Str(missing=None),
+            "count": fields.Str(missing="none"),
+            "fieldset": fields.Str(missing=None, data_key="fields")
         }
     )
-    @cache.cached(timeout=60, query_string=True)
-    def get(cls,keyword: str, page: int, per_page: int, sort: str, order: str):
+    @conditional(lambda **kwargs: namespace_version([ITEMS]))
+    @cached(timeout=60, namespaces=[ITEMS], stale=600)
+    def get(cls,keyword: str, page: int, per_page: int, sort: str, order: str, cursor: str, count: str, fieldset: str):
         
-        if sort not in ['created_at', 'name']:
+        if sort not in ['created_at', 'name', 'relevance']:
             sort = 'created_at'
             
         if order not in ['asc', 'desc']:
             order = 'desc'
         
-        paginated_item = ItemModel.find_all(keyword, page, per_page, sort, order)
-        return item_pagination_schema.dump(paginated_item), HTTPStatus.OK         
+        if count not in COUNT_MODES:
+            count = 'none'
+        
+        fieldset = parse_fields(fieldset, ITEM_FIELDS)
+        schema = sparse_schema(ItemPaginationSchema, fieldset) if fieldset else item_pagination_schema
+        
+        paginated_item = ItemModel.find_all(keyword, page, per_page, sort, order, cursor, count, fieldset)
+        return fastdump.dump(schema, paginated_item), HTTPStatus.OK         
+    
     
     
+
+class CategoryItemListResource(Resource):
     
+    decorators = [limiter.limit('10 per minute', methods=['GET'], error_message='Too Many Requests')]
+    @classmethod
+    @jwt_optional
+    @use_kwargs(
+        {
+            "keyword": fields.Str(missing=""), 
+            "page": fields.Int(missing=1), 
+            "per_page": fields.Int(missing=10),
+            "sort": fields.Str(missing="created_at"),
+            "order": fields.Str(missing="desc"),
+            "cursor": fields.Str(missing=None),
+            "count": fields.Str(missing="none"),
+            "fieldset": fields.Str(missing=None, data_key="fields")
+        }
+    )
+    @conditional(lambda **kwargs: namespace_version([ITEMS, CATEGORIES]))
+    @cached(timeout=60, namespaces=[ITEMS, CATEGORIES], stale=600)
+    def get(cls, name: str, keyword: str, page: int, per_page: int, sort: str, order: str, cursor: str, count: str, fieldset: str):
+        
+        if sort not in ['created_at', 'name', 'relevance']:
+            sort = 'created_at'
+            
+        if order not in ['asc', 'desc']:
+            order = 'desc'
+        
+        if count not in COUNT_MODES:
+            count = 'none'
+        
+        fieldset = parse_fields(fieldset, ITEM_FIELDS)
+        schema = sparse_schema(ItemPaginationSchema, fieldset) if fieldset else item_pagination_schema
+        
+        category = Category.find_by_name(name)
+        if not category:
+            return {"message": gettext("category_not_found")}, HTTPStatus.NOT_FOUND
+        paginated_item = ItemModel.find_by_category(category.id, keyword, page, per_page, sort, order, cursor, count, fieldset)
+        return fastdump.dump(schema, paginated_item), HTTPStatus.OK
+    
+    
+
+class ItemSuggestResource(Resource):
+    
+    @classmethod
+    @use_kwargs(
+        {
+            "q": fields.Str(missing=""),
+            "limit": fields.Int(missing=8)
+        }
+    )
+    def get(cls, q: str, limit: int):
+        
+        limit = min(max(limit, 1), 20)
+        if not q.strip():
+            return {"suggestions": []}, HTTPStatus.OK
+        return {"suggestions": ensure_loaded().search(q.strip(), limit)}, HTTPStatus.OK
+    
+    
+
 
 class SharedItemResource(Resource):
     
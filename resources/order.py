@@ -8,8 +8,13 @@ from http import HTTPStatus
 from webargs import fields
 from webargs.flaskparser import use_kwargs
 
+from libs import fastdump
+from libs.idempotency import idempotent
+from libs.keyset import COUNT_MODES
 from libs.strings import gettext
-from libs.utils import clear_cache
+from libs.cache import invalidate, ITEMS, supplier_items
+from libs.conditional import conditional
+from libs.fieldsets import parse_fields, sparse_schema
 
 from models.order import OrderModel, ItemsInOrder
 from models.item import ItemModel
@@ -17,16 +22,44 @@ from models.payment import PaymentModel
 from models.user import SupplierModel, ResellerModel, BuyerModel, SubAdminModel
 from schemas.order import OrderSchema, OrderPaginationSchema
 from transaction import transaction
+from resources.item import authorize_supplier
 
 order_schema = OrderSchema()
 order_list_schema = OrderSchema(many=True)
 order_pagination_schema = OrderPaginationSchema()
+fastdump.compile_schema(order_pagination_schema)
+ORDER_FIELDS = frozenset(order_schema.dump_fields)
+
+
+"""
+Versions for conditional GETs: an order's lines are copied at checkout, so an order
+changes only with its own row, whose updated_at every status change bumps; lists add
+their row count for deletions. The caller's identity keeps one account's ETags from
+matching another's.
+"""
+def order_version(order_id: str, **kwargs):
+    updated_at = OrderModel.find_updated_at(order_id)
+    if updated_at is None:
+        return None
+    return (get_jwt_identity(), updated_at), updated_at
+
+
+def supplier_orders_version(supplier_id: str, **kwargs):
+    count, updated_at = OrderModel.find_list_version(supplier_id=supplier_id)
+    return (get_jwt_identity(), count, updated_at), updated_at
+
+
+def reseller_orders_version(**kwargs):
+    reseller_id = get_jwt_identity()
+    count, updated_at = OrderModel.find_list_version(reseller_id=reseller_id)
+    return (reseller_id, count, updated_at), updated_at
 
 
 class SupplierOrderResource(Resource):
     
     @classmethod
     @jwt_required
+    @conditional(order_version, authorize=authorize_supplier)
     def get(cls, supplier_id, order_id):
         
         subadmin_id = get_jwt_identity()
@@ -86,10 +119,14 @@ class SupplierOrderListResource(Resource):
             "page": fields.Int(missing=1), 
             "per_page": fields.Int(missing=10),
             "sort": fields.Str(missing="created_at"),
-            "order": fields.Str(missing="desc")
+            "order": fields.Str(missing="desc"),
+            "cursor": fields.Str(missing=None),
+            "count": fields.Str(missing="none"),
+            "fieldset": fields.Str(missing=None, data_key="fields")
         }
     )
-    def get(cls, supplier_id: str, page: int, per_page: int, sort: str, order: str):
+    @conditional(supplier_orders_version, authorize=authorize_supplier)
+    def get(cls, supplier_id: str, page: int, per_page: int, sort: str, order: str, cursor: str, count: str, fieldset: str):
         
         subadmin_id = get_jwt_identity()
         subadmin = SubAdminModel.find_by_id(subadmin_id)
@@ -105,9 +142,15 @@ class SupplierOrderListResource(Resource):
             
             if order not in ['asc', 'desc']:
                 order = 'desc'
+            
+            if count not in COUNT_MODES:
+                count = 'none'
+            
+            fieldset = parse_fields(fieldset, ORDER_FIELDS)
+            schema = sparse_schema(OrderPaginationSchema, fieldset) if fieldset else order_pagination_schema
                 
-            pagination_order = OrderModel.find_by_supplier_id(supplier_id, page, per_page, sort, order)
-            return order_pagination_schema.dump(pagination_order), HTTPStatus.OK
+            pagination_order = OrderModel.find_by_supplier_id(supplier_id, page, per_page, sort, order, cursor, count, fieldset)
+            return fastdump.dump(schema, pagination_order), HTTPStatus.OK
         
         
         
@@ -115,6 +158,7 @@ class ResellerOrderResource(Resource):
     
     @classmethod
     @jwt_required
+    @conditional(order_version)
     def get(cls, order_id):
         
         reseller_id = get_jwt_identity() 
@@ -122,9 +166,6 @@ class ResellerOrderResource(Resource):
         if ResellerModel.find_by_id(reseller_id):
             order = OrderModel.find_by_id(order_id)
             if order:
-                if order.status != "paid" and order.expired:
-                    status = "cancelled"
-                    order.set_status(status)
                 return order_schema.dump(order), HTTPStatus.OK
               
             return {"message": gettext("order_not_found")}, HTTPStatus.NOT_FOUND
@@ -141,10 +182,14 @@ class ResellerOrderListResource(Resource):
             "page": fields.Int(missing=1), 
             "per_page": fields.Int(missing=10),
             "sort": fields.Str(missing="created_at"),
-            "order": fields.Str(missing="desc")
+            "order": fields.Str(missing="desc"),
+            "cursor": fields.Str(missing=None),
+            "count": fields.Str(missing="none"),
+            "fieldset": fields.Str(missing=None, data_key="fields")
         }
     )
-    def get(cls, page: int, per_page: int, sort: str, order: str):
+    @conditional(reseller_orders_version)
+    def get(cls, page: int, per_page: int, sort: str, order: str, cursor: str, count: str, fieldset: str):
         
         reseller_id = get_jwt_identity()
         if ResellerModel.find_by_id(reseller_id):
@@ -153,9 +198,15 @@ class ResellerOrderListResource(Resource):
                 
             if order not in ['asc', 'desc']:
                 order = 'desc'
+            
+            if count not in COUNT_MODES:
+                count = 'none'
+            
+            fieldset = parse_fields(fieldset, ORDER_FIELDS)
+            schema = sparse_schema(OrderPaginationSchema, fieldset) if fieldset else order_pagination_schema
                     
-            pagination_order = OrderModel.find_by_reseller_id(reseller_id, page, per_page, sort, order)
-            return order_pagination_schema.dump(pagination_order), HTTPStatus.OK
+            pagination_order = OrderModel.find_by_reseller_id(reseller_id, page, per_page, sort, order, cursor, count, fieldset)
+            return fastdump.dump(schema, pagination_order), HTTPStatus.OK
         return {"message": gettext("user_not_found")}, HTTPStatus.NOT_FOUND
         
         
@@ -165,6 +216,7 @@ class ResellerOrderListResource(Resource):
 class OrderCreationResource(Resource):
     @classmethod
     @jwt_required
+    @idempotent
     def post(cls):
         
         reseller_id = get_jwt_identity()
@@ -178,46 +230,36 @@ class OrderCreationResource(Resource):
         buyercity = item_data["buyercity"]
         buyerstate = item_data["buyerstate"]
         
+        found_items = ItemModel.find_by_ids(list(item_id_quantity))
         
+        for _id in item_id_quantity:
+            if _id not in found_items:
+                return {"message": gettext("order_item_not_found")}, HTTPStatus.NOT_FOUND
         
-        buyer = BuyerModel.find_buyer(buyerfirstname, buyerlastname, buyeraddress, buyercity, buyerstate)
-        if not buyer:
-            buyer = BuyerModel(firstname=buyerfirstname, lastname=buyerlastname, address=buyeraddress, city=buyercity, state=buyerstate, ip_address=request.remote_addr)
-            try:
-                buyer.save_to_db()
-            except:
-                traceback.print_exc()
+        shortfalls = ItemModel.reserve_stock(item_id_quantity)
+        if shortfalls:
+            return {"message": gettext("order_stock_shortfall"), "shortfalls": shortfalls}, HTTPStatus.NOT_ACCEPTABLE
         
         for _id, count in item_id_quantity.most_common():
-            item = ItemModel.find_by_id(_id)
-            if not item:
-                return {"message": gettext("order_item_not_found")}, HTTPStatus.NOT_FOUND
-            
-            if not item.quantity >= count:
-                return {"message": "Item {} is remaining {}".format(item.name, item.quantity)}, HTTPStatus.NOT_ACCEPTABLE
-            
-            item.quantity -= count
-            item_in_order = ItemsInOrder(item_id=_id, quantity=count, margin=item_data["margin"])
-            item_in_order.save_to_db()
+            item = found_items[_id]
+            item_in_order = ItemsInOrder(item=item, quantity=count, margin=item_data["margin"])
             item_in_order.set_amount()
             item_in_order.set_total_amount()
             items.append(item_in_order)
-            
-            print(item_in_order.amount)
+        
+        buyer = BuyerModel.find_buyer(buyerfirstname, buyerlastname, buyeraddress, buyercity, buyerstate)
+        if not buyer:
+            buyer = BuyerModel(firstname=buyerfirstname, lastname=buyerlastname, address=buyeraddress, city=buyercity, state=buyerstate, ip_address=request.remote_addr)
             
         order = OrderModel(status="pending", supplier_id=supplier_id, reseller_id=reseller_id, items=items, buyer_id=buyer.id)
+        order.buyer = buyer
+        order.set_reseller_amount()
+        order.set_supplier_amount()
+        payment = PaymentModel(order_id=order.id, amount=order.reseller_amount)
         
         try:
-            order.save_to_db()
-            clear_cache('/items')
-            order.set_reseller_amount()
-            order.set_supplier_amount()
-            payment = PaymentModel(order_id=order.id, amount=order.reseller_amount)
-            try:
-                payment.save_to_db()
-            except:
-                traceback.print_exc()
-            print(order.reseller_amount)
+            order.save_with_payment(payment)
+            invalidate(ITEMS, *{supplier_items(item.supplier_id) for item in found_items.values()})
             return {"message": gettext("order_created"), "order": order_schema.dump(order)}, HTTPStatus.OK
         except:
             traceback.print_exc()
@@ -229,6 +271,7 @@ class OrderCreationResource(Resource):
 class OrderPaymentResource(Resource):
     
     @classmethod
+    @idempotent
     def post(cls, order_id: str):
         
         data = request.get_json()
@@ -254,6 +297,7 @@ class OrderPaymentResource(Resource):
                     
             if payment:
                 payment.reference = reference
+                payment.status = None #a new reference has not been charged yet
                 print(payment.reference)
                 try:
                     payment.save_to_db()
@@ -265,6 +309,7 @@ class OrderPaymentResource(Resource):
                 return init, HTTPStatus.OK
             else:
                 return {"message": gettext("order_not_found")}, HTTPStatus.NOT_FOUND
+        return {"message": gettext("order_not_found")}, HTTPStatus.NOT_FOUND
             
 
 
@@ -276,14 +321,14 @@ class OrderCancellationResource(Resource):
         order = OrderModel.find_by_id(order_id)
         if order:
             if order.status == "pending" or order.status == "unpaid":
-                order.status = "cancelled"
-                for item in order.items:
-                    item.item.quantity += item.quantity
                 try:
-                    order.save_to_db()
+                    cancelled = order.cancel()
                 except:
                     traceback.print_exc()
                     return {"message": "error cancelling order"}, HTTPStatus.INTERNAL_SERVER_ERROR
+                if not cancelled:
+                    return {"message": gettext("order_update_failed")}, HTTPStatus.CONFLICT
+                invalidate(ITEMS, supplier_items(order.supplier_id))
                 return {"message": "order_cancelled"}, HTTPStatus.OK
             elif order.status == "paid":
                 return {"message": "Can not cancel order, payment has been made already"}, HTTPStatus.BAD_REQUEST
@@ -4,47 +4,58 @@ from flask_jwt_extended import get_jwt_identity, jwt_required, jwt_optional
 from marshmallow import ValidationError
 from http import HTTPStatus
 
+from libs.background import run_in_background
 from libs.strings import gettext
 
 from models.order import OrderModel
 from models.payment import PaymentModel
 from models.user import ResellerModel, BuyerModel
 from schemas.payment import PaymentSchema
-from transaction import transaction
+from transaction import transaction, verify_signature
 
 payment_schema = PaymentSchema()
 
+PAYSTACK_CHARGE_EVENTS = ("charge.success",)
 
 
 class PaymentResource(Resource):
     @classmethod
     def get(cls):
         
-    
         reference = request.args.get("reference")
         payment = PaymentModel.find_by_reference(reference)
-        response = transaction.verify(reference)
-        order = OrderModel.find_by_id(str(payment.order_id))
+        if not payment:
+            return {"message": gettext("payment_not_found")}, HTTPStatus.NOT_FOUND
         
-        if order:
-            buyer = BuyerModel.find_by_id(str(order.buyer_id))
-            buyer.set_ip_address(response[3]["ip_address"])
+        #the webhook normally records the charge, Paystack is only asked when we have not heard back yet
+        if payment.status is None:
+            response = transaction.verify(reference)
+            try:
+                payment.record_charge(response[3]["status"], response[3].get("ip_address"))
+            except:
+                traceback.print_exc()
+                return {"message": gettext("payment_creation_error")}, HTTPStatus.INTERNAL_SERVER_ERROR
         
-            if response[3]["status"] == "success":
-                status = "paid" 
-                order.set_status(status)
-                return {"message": gettext("payment_success"), "payment_id": payment.id, "payment": response}, HTTPStatus.OK
-            
-            elif response[3]["status"] == "failed":
-                status = "unpaid" 
-                order.set_status(status)
-                return {"message": gettext("payment_failed"), "payment_id": payment.id, "payment": response}, HTTPStatus.OK
-           
-                
+        if payment.status == "success":
+            return {"message": gettext("payment_success"), "payment_id": payment.id, "payment": payment_schema.dump(payment)}, HTTPStatus.OK
         
-                
-                    
+        elif payment.status == "failed":
+            return {"message": gettext("payment_failed"), "payment_id": payment.id, "payment": payment_schema.dump(payment)}, HTTPStatus.OK
         
+        return {"message": gettext("payment_pending"), "payment_id": payment.id, "payment": payment_schema.dump(payment)}, HTTPStatus.OK
+    
+    
 
-            
-            
\ No newline at end of file
+class PaystackWebhookResource(Resource):
+    
+    @classmethod
+    def post(cls):
+        
+        if not verify_signature(request.get_data(), request.headers.get("X-Paystack-Signature")):
+            return {"message": gettext("payment_invalid_signature")}, HTTPStatus.UNAUTHORIZED
+        
+        event = request.get_json(force=True)
+        if event.get("event") in PAYSTACK_CHARGE_EVENTS:
+            data = event["data"]
+            run_in_background(PaymentModel.record_charge_by_reference, data["reference"], data["status"], data.get("ip_address"))
+        return {"message": gettext("payment_event_received")}, HTTPStatus.OK
@@ -102,7 +102,7 @@ class SubAdminResource(Resource):
     @jwt_required
     def get(cls):
         subadmin_id = get_jwt_identity()
-        subadmin = SubAdminModel.find_by_id(subadmin_id)
+        subadmin = SubAdminModel.find_profile(subadmin_id)
         if subadmin:
             return subadmin_schema.dump(subadmin), HTTPStatus.OK
         return {"message": gettext("user_not_found")}, HTTPStatus.NOT_FOUND
@@ -244,7 +244,7 @@ class Supplier(Resource):
                 supplier_ids.append(supplier.id)
             if supplier_id not in supplier_ids:
                 return {"message": gettext("account_access_denied")}, HTTPStatus.FORBIDDEN
-            supplier = SupplierModel.find_by_id(supplier_id)
+            supplier = SupplierModel.find_profile(supplier_id)
             if supplier:
                 return supplier_schema.dump(supplier), HTTPStatus.OK
             else:
@@ -377,7 +377,7 @@ class Reseller(Resource):
     @jwt_required
     def get(cls):
         user_id = get_jwt_identity()
-        user = ResellerModel.find_by_id(user_id)
+        user = ResellerModel.find_profile(user_id)
         if user:
             return reseller_schema.dump(user), HTTPStatus.OK
         return {"message": gettext("user_not_found")}, HTTPStatus.NOT_FOUND
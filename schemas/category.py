@@ -1,14 +1,18 @@
+from marshmallow import fields
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema, auto_field
 
 from extension import ma
 from models.category import Category
-from models.item import ItemModel
-from schemas.item import ItemSchema
 
 
 class CategorySchema(ma.SQLAlchemyAutoSchema):
-    items = ma.Nested(ItemSchema, many=True)
+    item_count = fields.Method(serialize="dump_item_count")
     class Meta:
         model = Category
-        dump_only = ("id", "items")
+        dump_only = ("id", "item_count")
         load_instance = True
+    
+    def dump_item_count(self, category: Category, **kwargs):
+        if "item_count" in category.__dict__:
+            return category.item_count
+        return category.count_items()
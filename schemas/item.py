@@ -1,8 +1,9 @@
 from flask import url_for
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema, auto_field
-from marshmallow import fields
+from marshmallow import fields, pre_dump
 
 from extension import ma
+from libs import blobs, img_helper, renditions
 from models.item import ItemModel, SharedItemModel
 from models.category import Category
 from models.image import ImageModel
@@ -12,6 +13,7 @@ from schemas.pagination import PaginationSchema
 
 class ItemSchema(ma.SQLAlchemyAutoSchema):
     image_url = fields.Method(serialize='dump_image_url', many=True)
+    image_renditions = fields.Method(serialize='dump_image_renditions')
     class Meta:
         model = ItemModel
         load_only = ("category",)
@@ -20,19 +22,43 @@ class ItemSchema(ma.SQLAlchemyAutoSchema):
         load_instance = True
     
     
+    @pre_dump(pass_many=True)
+    def _pre_dump(self, data, many, **kwargs):
+        if "image_url" in self.dump_fields or "image_renditions" in self.dump_fields:
+            items = data if many else [data]
+            ItemModel.load_image_names([item for item in items if isinstance(item, ItemModel)])
+        return data
+    
     def dump_image_url(self, item: ItemModel, **kwargs):
         
-        url = []
-        if item.item_images is None:
-            return url_for('static', filename='images/assets/default_thumbnail.svg', _external=True)
-        for image in item.item_images:
-            url.append(url_for('static', filename='images/{}/{}/{}'.format(item.supplier_id, item.id, image.name), _external=True))
-        return url
+        if "image_names" not in item.__dict__:
+            ItemModel.load_image_names([item])
+        return [self._image_prefix(item, blob_name) + (blob_name or name) for name, blob_name in item.image_names]
+    
+    def dump_image_renditions(self, item: ItemModel, **kwargs):
+        
+        if "rendition_names" not in item.__dict__:
+            ItemModel.load_image_names([item])
+        return [{rendition: self._image_prefix(item, blob_name) + rendition_name 
+                 for rendition, rendition_name in renditions.rendition_names(blob_name or name).items()}
+                for name, blob_name in item.rendition_names]
+    
+    @staticmethod
+    def _image_prefix(item: ItemModel, blob_name: str) -> str:
+        if blob_name:
+            return blobs.get_url_prefix()
+        return '{}{}/{}/'.format(img_helper.get_url_prefix(), item.supplier_id, item.id)
         
                 
     
         
 
+class ItemPreviewSchema(ma.SQLAlchemyAutoSchema):
+    class Meta:
+        model = ItemModel
+        fields = ("id", "name", "price", "quantity", "created_at")
+        
+
 class SharedItemSchema(ma.SQLAlchemyAutoSchema):
     class Meta:
         model = SharedItemModel
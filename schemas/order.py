@@ -11,7 +11,7 @@ from schemas.pagination import PaginationSchema
 
 
 class OrderSchema(ma.SQLAlchemyAutoSchema):
-    items = ma.Nested(ItemSchema, many=True, exclude=('image_url', ))
+    items = ma.Nested(ItemSchema, many=True, exclude=('image_url', 'image_renditions'))
     payment_api_url = fields.Method(serialize="dump_payment_link")
     class Meta:
         model = OrderModel
@@ -25,6 +25,12 @@ class OrderSchema(ma.SQLAlchemyAutoSchema):
         return link
         
 
+class OrderPreviewSchema(ma.SQLAlchemyAutoSchema):
+    class Meta:
+        model = OrderModel
+        fields = ("id", "status", "reseller_amount", "supplier_amount", "created_at")
+        
+
 class OrderPaginationSchema(PaginationSchema):
     data = fields.Nested(OrderSchema, attribute='items', many=True)
 
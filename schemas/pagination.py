@@ -4,8 +4,11 @@ from flask import request
 from flask_sqlalchemy import Pagination
 from marshmallow import fields
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
+from typing import Union
 from urllib.parse import urlencode
 
+from libs.keyset import KeysetPagination
+
 
 
 class PaginationSchema(ma.SQLAlchemySchema):
@@ -16,14 +19,23 @@ class PaginationSchema(ma.SQLAlchemySchema):
     pages = fields.Integer(dump_only=True)
     per_page = fields.Integer(dump_only=True)
     total = fields.Integer(dump_only=True)
+    next_cursor = fields.String(dump_only=True)
+    prev_cursor = fields.String(dump_only=True)
     
     @staticmethod
-    def get_url(page):
+    def get_url(page=None, cursor=None):
         query_args = request.args.to_dict()
-        query_args['page'] = page
+        if cursor is not None:
+            query_args.pop('page', None)
+            query_args['cursor'] = cursor
+        else:
+            query_args['page'] = page
         return '{}?{}'.format(request.base_url, urlencode(query_args))
     
-    def get_pagination_links(self, paginated_objects: Pagination):
+    def get_pagination_links(self, paginated_objects: Union[Pagination, KeysetPagination]):
+        if isinstance(paginated_objects, KeysetPagination):
+            return self.get_cursor_links(paginated_objects)
+        
         pagination_links = {
             'first': self.get_url(page=1),
             'last': self.get_url(page=paginated_objects.pages)
@@ -33,3 +45,13 @@ class PaginationSchema(ma.SQLAlchemySchema):
         if paginated_objects.has_next:
             pagination_links['next'] = self.get_url(page=paginated_objects.next_num)
         return pagination_links
+    
+    def get_cursor_links(self, paginated_objects: KeysetPagination):
+        pagination_links = {
+            'first': self.get_url(cursor='')
+        }
+        if paginated_objects.has_prev:
+            pagination_links['prev'] = self.get_url(cursor=paginated_objects.prev_cursor)
+        if paginated_objects.has_next:
+            pagination_links['next'] = self.get_url(cursor=paginated_objects.next_cursor)
+        return pagination_links
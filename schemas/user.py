@@ -1,6 +1,6 @@
 from extension import ma
 
-from marshmallow import pre_dump
+from marshmallow import fields, pre_dump
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema, auto_field
 
 from models.user import SupplierModel, ResellerModel, SubAdminModel
@@ -8,31 +8,45 @@ from models.bank import SupplierBank, ResellerBank
 from models.order import OrderModel
 from models.item import ItemModel, SharedItemModel
 
-from schemas.order import OrderSchema
+from schemas.order import OrderPreviewSchema
 from schemas.bank import SupplierBankSchema, ResellerBankSchema
-from schemas.item import ItemSchema, SharedItemSchema
+from schemas.item import ItemPreviewSchema, SharedItemSchema
 
 
+"""
+Profiles show counts and the newest PREVIEW_SIZE orders and items;
+full collections are on the paginated /<supplier_id>/orders, /<supplier_id>/items and /orders
+"""
 class SupplierSchema(ma.SQLAlchemyAutoSchema):
     bankaccount = ma.Nested(SupplierBankSchema)
-    orders = ma.Nested(OrderSchema, many=True)
-    items = ma.Nested(ItemSchema, many=True)
+    order_count = fields.Integer()
+    recent_orders = ma.Nested(OrderPreviewSchema, many=True)
+    item_count = fields.Integer()
+    recent_items = ma.Nested(ItemPreviewSchema, many=True)
     class Meta:
         model = SupplierModel
-        dump_only = ("id", "active", "bankaccount", "orders", "items")
+        dump_only = ("id", "active", "bankaccount", "order_count", "recent_orders", "item_count", "recent_items")
         include_fk = True
         load_instance = True
 
 
+class SupplierSummarySchema(ma.SQLAlchemyAutoSchema):
+    class Meta:
+        model = SupplierModel
+        fields = ("id",)
+
+
 
 class ResellerSchema(ma.SQLAlchemyAutoSchema):
     bankaccount = ma.Nested(ResellerBankSchema)
-    orders = ma.Nested(OrderSchema, many=True)
-    shareditems = ma.Nested(SharedItemSchema, many=True)
+    order_count = fields.Integer()
+    recent_orders = ma.Nested(OrderPreviewSchema, many=True)
+    shareditem_count = fields.Integer()
+    recent_shareditems = ma.Nested(SharedItemSchema, many=True)
     class Meta:
         model = ResellerModel
         load_only = ("password",)
-        dump_only = ("id", "confirmations", "bankaccount", "orders", "shareditems")
+        dump_only = ("id", "confirmations", "bankaccount", "order_count", "recent_orders", "shareditem_count", "recent_shareditems")
         include_fk = True
         load_instance = True
 
@@ -43,12 +57,7 @@ class ResellerSchema(ma.SQLAlchemyAutoSchema):
 
 
 class SubAdminSchema(ma.SQLAlchemyAutoSchema):
-    suppliers = ma.Nested(SupplierSchema, many=True, 
-                          exclude=('name', 'email', 'address1', 'address2', 'city', 
-                                   'state', 'zipcode', 'businessregistered', 'cacnumber', 
-                                   'maincategory', 'businesstype', 'pricerange', 'averagestock', 
-                                   'saleschannel', 'active', 'subadmin_id', 'bankaccount', 'items', 'orders', 
-                                   'updated_at', 'created_at', 'ip_address'))
+    suppliers = ma.Nested(SupplierSummarySchema, many=True)
     class Meta:
         model = SubAdminModel
         load_only = ("password",)
@@ -0,0 +1,41 @@
+"""
+Fixtures for tests that need a database: a Flask app bound to a temporary SQLite file
+with every table created. Postgres UUID columns are stored as text there.
+"""
+
+import os
+import shutil
+import tempfile
+
+import pytest
+
+os.environ.setdefault("PAYSTACK_AUTHORIZATION_KEY", "sk_test_webhook") #transaction builds its client at import
+from flask import Flask
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+
+from db import db
+from models import bank, category, confirmation, idempotency, image, item, order, payment, user #mapper relationships name these
+
+
+@compiles(UUID, "sqlite")
+def _compile_uuid(element, compiler, **kwargs):
+    return "CHAR(36)"
+
+
+@pytest.fixture
+def app():
+    folder = tempfile.mkdtemp()
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI="sqlite:///" + os.path.join(folder, "test.db"),
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        SQLALCHEMY_ENGINE_OPTIONS={"connect_args": {"timeout": 30}}, #threads wait for the write lock
+    )
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+    shutil.rmtree(folder, ignore_errors=True)
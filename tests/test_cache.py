@@ -0,0 +1,51 @@
+import pytest
+from flask_jwt_extended import JWTManager, create_access_token
+from flask_restful import Api
+
+from db import db
+from extension import cache
+from libs import cache as cache_module
+from models.user import SubAdminModel
+from resources.cache import CacheStatsResource
+
+
+@pytest.fixture
+def simple_cache(app):
+    cache.init_app(app, config={"CACHE_TYPE": "simple"})
+    with app.test_request_context("/"):
+        yield cache
+
+
+def test_only_the_claimant_releases_a_refresh_lock(simple_cache):
+    token = cache_module._claim_refresh("key")
+    assert token and cache_module._claim_refresh("key") is None
+    cache_module._release_refresh("key", "someone else's")
+    assert simple_cache.get("refresh:key") == token
+    cache_module._release_refresh("key", token)
+    assert simple_cache.get("refresh:key") is None
+
+
+def test_a_timed_out_wait_leaves_the_holders_lock(simple_cache, monkeypatch):
+    monkeypatch.setattr(cache_module, "REFRESH_LOCK_TIMEOUT", 0.1)
+    simple_cache.add("refresh:key", "holder", timeout=0) #another worker, still computing
+    response = cache_module._revalidating("key", [1], 60, 60, lambda: ({"built": True}, 200))
+    assert response == ({"built": True}, 200)
+    assert simple_cache.get("refresh:key") == "holder"
+
+
+def test_stats_are_served_to_subadmins_only(app, simple_cache):
+    app.config["JWT_SECRET_KEY"] = "secret"
+    JWTManager(app)
+    Api(app).add_resource(CacheStatsResource, "/admin/cache/stats")
+    subadmin = SubAdminModel(id="0" * 32, firstname="a", lastname="b", username="ab", email="a@b.c",
+                             street="s", city="c", state="s", zipcode="00000", password="x", ip_address="127.0.0.1")
+    db.session.add(subadmin)
+    db.session.commit()
+    cache_module._get_shared("missing")
+    client = app.test_client()
+
+    auth = lambda identity: {"Authorization": f"Bearer {create_access_token(identity=identity)}"}
+    assert client.get("/admin/cache/stats", headers=auth("1" * 32)).status_code == 403
+    response = client.get("/admin/cache/stats", headers=auth(subadmin.id))
+    assert response.status_code == 200
+    assert response.get_json()["l2"]["misses"] >= 1
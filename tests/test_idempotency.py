@@ -0,0 +1,57 @@
+from http import HTTPStatus
+from time import time
+
+import pytest
+from flask_jwt_extended import JWTManager
+
+from db import db
+from libs.idempotency import IDEMPOTENCY_HEADER, _scoped_key, idempotent
+from models.idempotency import IDEMPOTENCY_KEY_LEASE, IdempotencyKeyModel
+
+
+@pytest.fixture
+def client(app):
+    JWTManager(app)
+    calls = []
+
+    @app.route("/charge/<string:body>", methods=["POST"])
+    @idempotent
+    def charge(body):
+        calls.append(body)
+        return ({"charged": len(calls)} if body == "json" else {"charged": {len(calls)}}), HTTPStatus.CREATED
+
+    app.calls = calls
+    return app.test_client()
+
+
+def test_retries_get_the_stored_response(client, app):
+    headers = {IDEMPOTENCY_HEADER: "key"}
+    first = client.post("/charge/json", headers=headers)
+    second = client.post("/charge/json", headers=headers)
+    assert (first.status_code, second.status_code) == (HTTPStatus.CREATED, HTTPStatus.CREATED)
+    assert first.get_json() == second.get_json() == {"charged": 1}
+    assert app.calls == ["json"]
+
+
+def test_a_response_that_cannot_be_stored_releases_the_key(client, app):
+    headers = {IDEMPOTENCY_HEADER: "key"}
+    #flask cannot serialize the body either, after the wrapper has tried to store it
+    assert client.post("/charge/set", headers=headers).status_code == HTTPStatus.INTERNAL_SERVER_ERROR
+    assert IdempotencyKeyModel.query.count() == 0
+
+    assert client.post("/charge/json", headers=headers).status_code == HTTPStatus.CREATED
+    assert app.calls == ["set", "json"]
+
+
+def test_claims_past_their_lease_are_taken_over(client, app):
+    headers = {IDEMPOTENCY_HEADER: "key"}
+    with app.test_request_context("/charge/json", method="POST", headers=headers):
+        key = _scoped_key("key")
+    claim = IdempotencyKeyModel.claim(key)
+    assert claim.expire_at <= time() + IDEMPOTENCY_KEY_LEASE
+    assert client.post("/charge/json", headers=headers).status_code == HTTPStatus.CONFLICT
+
+    claim.expire_at = 0 #the worker holding it died
+    db.session.commit()
+    assert client.post("/charge/json", headers=headers).status_code == HTTPStatus.CREATED
+    assert app.calls == ["json"]
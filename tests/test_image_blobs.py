@@ -0,0 +1,65 @@
+import os
+import tempfile
+
+from flask_uploads import configure_uploads
+from uuid import uuid4
+
+from db import db
+from libs import blobs, img_helper
+from models.image import ImageBlobModel
+from models.item import ItemModel
+
+HASH = "ab" * 32
+
+
+def test_blob_references_are_counted_and_revived(app):
+    assert ImageBlobModel.acquire(HASH, ".png") == (HASH + ".png", True)
+    assert ImageBlobModel.acquire(HASH, ".jpg") == (HASH + ".png", False)
+    db.session.commit()
+
+    assert ImageBlobModel.release([HASH]) == []
+    assert ImageBlobModel.release([HASH]) == [HASH + ".png"]
+    db.session.commit()
+
+    #a released blob is revived under the extension of whoever uploads it next
+    assert ImageBlobModel.acquire(HASH, ".jpg") == (HASH + ".jpg", True)
+    db.session.commit()
+    assert ImageBlobModel.query.get(HASH).ref_count == 1
+
+
+def store_blob(name: str) -> str:
+    return blobs.store(tempfile.mkstemp()[1], name)
+
+
+def test_released_files_survive_a_revival_before_removal(app):
+    app.config["UPLOADED_IMAGES_DEST"] = tempfile.mkdtemp()
+    configure_uploads(app, img_helper.IMAGE_SET)
+    name, _ = ImageBlobModel.acquire(HASH, ".png")
+    path = store_blob(name)
+    db.session.commit()
+
+    released = ImageBlobModel.release([HASH])
+    db.session.commit()
+    assert ImageBlobModel.acquire(HASH, ".png") == (name, True) #an upload of the same photo got in first
+    store_blob(name)
+    db.session.commit()
+    blobs.remove(released)
+    assert os.path.isfile(path)
+
+    released = ImageBlobModel.release([HASH])
+    db.session.commit()
+    blobs.remove(released)
+    assert not os.path.exists(path)
+
+
+def test_single_and_batch_uploads_draw_image_numbers_from_one_counter(app):
+    item = ItemModel(supplier_id=uuid4().hex, category_id=uuid4().hex, name="item", price=100.0, description="item")
+    item.id, item.quantity = uuid4().hex, 1
+    db.session.add(item)
+    db.session.commit()
+    assert ItemModel.add_images(item.id, 1) == 1
+    assert ItemModel.add_images(item.id, 3) == 2
+    assert ItemModel.add_images(item.id, 1) == 5
+    db.session.commit()
+    db.session.refresh(item)
+    assert (item.image_count, item.file_image_count) == (5, 5)
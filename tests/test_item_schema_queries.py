@@ -0,0 +1,51 @@
+from contextlib import contextmanager
+from uuid import uuid4
+
+from sqlalchemy import event
+
+from db import db
+from models.image import ImageModel
+from models.item import ItemModel
+from schemas.item import ItemSchema
+
+
+@contextmanager
+def count_queries():
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+
+def make_items(count: int) -> None:
+    supplier_id = uuid4().hex
+    for n in range(count):
+        item = ItemModel(supplier_id=supplier_id, category_id=uuid4().hex, name=f"item {uuid4().hex}", price=100.0, description="item")
+        item.quantity = 1
+        db.session.add(item)
+        db.session.add_all([ImageModel(f"{item.id}_{number}.jpg", item.id) for number in (1, 2)])
+    db.session.commit()
+
+
+def dump_page(app, size: int):
+    with app.test_request_context("/items"):
+        db.session.expunge_all()
+        page = ItemModel.query.limit(size).all()
+        with count_queries() as statements:
+            dumped = ItemSchema(many=True).dump(page)
+    return dumped, statements
+
+
+def test_page_dump_issues_constant_number_of_queries(app):
+    make_items(50)
+    
+    small, small_statements = dump_page(app, 5)
+    large, large_statements = dump_page(app, 50)
+    
+    assert len(large) == 50
+    assert all(len(item["image_url"]) == 2 for item in large)
+    assert len(large_statements) == len(small_statements) <= 1
@@ -0,0 +1,29 @@
+from datetime import datetime
+from uuid import uuid4
+
+from flask_jwt_extended import JWTManager
+
+from db import db
+from extension import cache
+from libs.cache import invalidate, ITEMS
+from models.order import OrderModel
+from resources.order import order_version, reseller_orders_version
+
+
+def test_order_versions_move_with_the_orders_only(app):
+    JWTManager(app)
+    cache.init_app(app, config={"CACHE_TYPE": "simple"})
+    order = OrderModel("pending", uuid4().hex, uuid4().hex, [], None)
+    db.session.add(order)
+    db.session.commit()
+    order.updated_at = datetime(2020, 1, 1)
+    db.session.commit()
+
+    with app.test_request_context("/"):
+        before = order_version(order.id), reseller_orders_version()
+        invalidate(ITEMS) #checkouts, cancellations and edits of any item
+        assert (order_version(order.id), reseller_orders_version()) == before
+
+        assert order.cancel()
+        db.session.expire_all()
+        assert order_version(order.id) != before[0]
@@ -0,0 +1,111 @@
+import hashlib
+import hmac
+import json
+from http import HTTPStatus
+from uuid import uuid4
+
+import pytest
+from flask_restful import Api
+
+import resources.payment
+import transaction
+from db import db
+from models.order import OrderModel
+from models.payment import PaymentModel
+from resources.payment import PaymentResource, PaystackWebhookResource
+
+SECRET = "sk_test_webhook"
+
+
+@pytest.fixture
+def client(app, monkeypatch):
+    monkeypatch.setattr(transaction, "PAYSTACK_SECRET_KEY", SECRET)
+    #jobs run inline so the test sees what the background worker would have recorded
+    monkeypatch.setattr(resources.payment, "run_in_background", lambda func, *args, **kwargs: func(*args, **kwargs))
+    api = Api(app)
+    api.add_resource(PaymentResource, "/payment")
+    api.add_resource(PaystackWebhookResource, "/payment/webhook")
+    return app.test_client()
+
+
+def make_payment(status: str = "pending", reference: str = "ref-1") -> PaymentModel:
+    order = OrderModel(status, uuid4().hex, uuid4().hex, [], None)
+    db.session.add(order)
+    payment = PaymentModel(order_id=order.id, amount=1000.0, reference=reference)
+    db.session.add(payment)
+    db.session.commit()
+    return payment
+
+
+def order_of(payment: PaymentModel) -> OrderModel:
+    db.session.expire_all()
+    return OrderModel.query.get(payment.order_id)
+
+
+def sign(payload: bytes) -> str:
+    return hmac.new(SECRET.encode("utf-8"), payload, hashlib.sha512).hexdigest()
+
+
+def post_event(client, event: str, reference: str, status: str, signature: str = None):
+    payload = json.dumps({"event": event, "data": {"reference": reference, "status": status}}).encode("utf-8")
+    return client.post("/payment/webhook", data=payload, content_type="application/json",
+                       headers={"X-Paystack-Signature": signature or sign(payload)})
+
+
+def test_verify_signature(monkeypatch):
+    monkeypatch.setattr(transaction, "PAYSTACK_SECRET_KEY", SECRET)
+    payload = b'{"event": "charge.success"}'
+    assert transaction.verify_signature(payload, sign(payload))
+    assert not transaction.verify_signature(payload + b" ", sign(payload))
+    assert not transaction.verify_signature(payload, None)
+    monkeypatch.setattr(transaction, "PAYSTACK_SECRET_KEY", None)
+    assert not transaction.verify_signature(payload, sign(payload))
+
+
+def test_webhook_rejects_unsigned_events(client):
+    payment = make_payment()
+    response = post_event(client, "charge.success", "ref-1", "success", signature="forged")
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+    assert order_of(payment).status == "pending"
+
+
+def test_webhook_records_the_charge_once(client):
+    payment = make_payment()
+    for _ in range(2): #Paystack redelivers until it gets a 200
+        assert post_event(client, "charge.success", "ref-1", "success").status_code == HTTPStatus.OK
+    assert order_of(payment).status == "paid"
+    assert PaymentModel.find_by_reference("ref-1").status == "success"
+    assert not PaymentModel.find_by_reference("ref-1").record_charge("success")
+
+
+def test_out_of_order_statuses_keep_the_first(app):
+    payment = make_payment()
+    assert payment.record_charge("success")
+    assert not payment.record_charge("failed")
+    assert PaymentModel.find_by_reference("ref-1").status == "success"
+    assert order_of(payment).status == "paid"
+
+
+def test_a_charge_after_cancellation_is_flagged_for_refund(app):
+    payment = make_payment()
+    assert order_of(payment).cancel()
+    assert payment.record_charge("success")
+    payment = PaymentModel.find_by_reference("ref-1")
+    assert (payment.status, payment.refund_due) == ("success", True)
+    assert order_of(payment).status == "cancelled"
+
+
+def test_payment_status_asks_paystack_only_while_unknown(client, monkeypatch):
+    verified = []
+    def verify(reference):
+        verified.append(reference)
+        return 200, True, "Verification successful", {"status": "success", "reference": reference}
+    monkeypatch.setattr(resources.payment.transaction, "verify", verify)
+    payment = make_payment()
+
+    for _ in range(2):
+        response = client.get("/payment?reference=ref-1")
+        assert response.status_code == HTTPStatus.OK
+        assert response.get_json()["payment"]["status"] == "success"
+    assert verified == ["ref-1"]
+    assert order_of(payment).status == "paid"
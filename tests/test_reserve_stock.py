@@ -0,0 +1,45 @@
+import threading
+from uuid import uuid4
+
+from db import db
+from models.item import ItemModel
+
+STOCK = 20
+THREADS = 50
+
+
+def test_concurrent_reservations_never_oversell(app):
+    item = ItemModel(supplier_id=uuid4().hex, category_id=uuid4().hex, name="item", price=100.0, description="item")
+    item.quantity = STOCK
+    db.session.add(item)
+    db.session.commit()
+    item_id = item.id
+    
+    reserved = []
+    errors = []
+    barrier = threading.Barrier(THREADS)
+    
+    def reserve():
+        with app.app_context():
+            try:
+                barrier.wait()
+                if not ItemModel.reserve_stock({item_id: 1}):
+                    db.session.commit()
+                    reserved.append(1)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                db.session.remove()
+    
+    threads = [threading.Thread(target=reserve) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    db.session.expire_all()
+    quantity = ItemModel.find_by_id(item_id).quantity
+    assert not errors
+    assert quantity >= 0
+    assert sum(reserved) == STOCK
+    assert quantity == STOCK - sum(reserved)
@@ -0,0 +1,32 @@
+import os
+import tempfile
+
+from libs.resizer import DiskCache
+
+
+def add_file(disk_cache: DiskCache, number: int, size: int = 100) -> str:
+    path = disk_cache.path_for(f"{number:04d}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(b"x" * size)
+    os.utime(path, (number, number)) #older numbers were served longer ago
+    disk_cache.add(path)
+    return path
+
+
+def test_adds_under_the_cap_do_not_rescan(monkeypatch):
+    disk_cache = DiskCache(tempfile.mkdtemp(), 10_000)
+    scans = []
+    scan = disk_cache._scan
+    monkeypatch.setattr(disk_cache, "_scan", lambda: scans.append(1) or scan())
+    for number in range(50):
+        add_file(disk_cache, number)
+    assert len(scans) == 1
+
+
+def test_the_cap_holds_for_files_other_workers_added():
+    folder = tempfile.mkdtemp()
+    workers = DiskCache(folder, 1000), DiskCache(folder, 1000)
+    paths = [add_file(workers[number % 2], number) for number in range(30)]
+    assert sum(os.path.getsize(path) for path in paths if os.path.exists(path)) <= 1000 + 2 * 100
+    assert os.path.exists(paths[-1]) and not os.path.exists(paths[0])
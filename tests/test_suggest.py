@@ -0,0 +1,52 @@
+from uuid import uuid4
+
+import pytest
+
+from db import db
+from extension import cache
+from libs import suggest
+from libs.cache import invalidate, NAMES
+from models.item import ItemModel
+
+
+@pytest.fixture
+def loads(app, monkeypatch):
+    cache.init_app(app, config={"CACHE_TYPE": "simple"})
+    monkeypatch.setattr(suggest, "suggestions", suggest.PrefixIndex())
+    calls = []
+    find_all_names = ItemModel.find_all_names
+    monkeypatch.setattr(ItemModel, "find_all_names", classmethod(lambda cls: calls.append(1) or find_all_names()))
+    return calls
+
+
+def add_item(name: str) -> ItemModel:
+    item = ItemModel(supplier_id=uuid4().hex, category_id=uuid4().hex, name=name, price=100.0, description=name)
+    item.id, item.quantity = uuid4().hex, 1
+    db.session.add(item)
+    db.session.commit()
+    return item
+
+
+def names(prefix: str) -> list:
+    return [suggestion["name"] for suggestion in suggest.ensure_loaded().search(prefix, 10)]
+
+
+def test_own_writes_update_the_index_without_a_reload(loads):
+    add_item("chair")
+    assert names("ch") == ["chair"]
+
+    table = add_item("table")
+    suggest.publish(suggest.suggestions.add, "item", table.id, table.name)
+    suggest.publish(suggest.suggestions.rename, "item", table.id, "table", "chair table")
+    assert names("ch") == ["chair", "chair table"]
+    assert len(loads) == 1
+
+
+def test_other_workers_writes_reload_the_index(loads):
+    add_item("chair")
+    assert names("ch") == ["chair"]
+
+    add_item("chest") #committed by another worker, which bumped NAMES
+    invalidate(NAMES)
+    assert names("ch") == ["chair", "chest"]
+    assert len(loads) == 2
@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO
+
+import pytest
+from flask import Flask, request
+from flask_uploads import configure_uploads
+
+from libs import blobs, img_helper
+from libs.uploads import StreamingRequest, BATCH_ENDPOINT
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+@pytest.fixture
+def client():
+    folder = tempfile.mkdtemp()
+    app = Flask(__name__)
+    app.config.update(UPLOADED_IMAGES_DEST=folder, UPLOADED_IMAGES_MAX_BYTES=1024, UPLOADED_IMAGES_MAX_BATCH=10,
+                      MAX_CONTENT_LENGTH=4096)
+    app.request_class = StreamingRequest
+    configure_uploads(app, img_helper.IMAGE_SET)
+
+    @app.route("/upload", methods=["POST"])
+    @app.route("/batch", methods=["POST"], endpoint=BATCH_ENDPOINT)
+    def upload():
+        return {"files": len(request.files.getlist("images"))}
+
+    with app.app_context():
+        root = blobs.get_root()
+    yield app.test_client(), root
+    shutil.rmtree(folder, ignore_errors=True)
+
+
+def temporary_files(root: str) -> list:
+    return [name for name in os.listdir(root) if name.endswith(".tmp")] if os.path.isdir(root) else []
+
+
+def test_parsed_uploads_are_discarded_when_the_request_closes(client):
+    client, root = client
+    response = client.post("/upload", content_type="multipart/form-data",
+                           data={"images": [(BytesIO(PNG), "a.png"), (BytesIO(PNG), "b.png")]})
+    assert response.get_json() == {"files": 2}
+    assert temporary_files(root) == []
+
+
+@pytest.mark.parametrize("second, status", [
+    ((b"GIF89a" + b"\x00" * 64, "b.png"), 415),
+    ((PNG + b"\x00" * 1024, "b.png"), 413),
+])
+def test_earlier_parts_are_discarded_when_a_later_part_aborts(client, second, status):
+    client, root = client
+    body, filename = second
+    response = client.post("/upload", content_type="multipart/form-data",
+                           data={"images": [(BytesIO(PNG), "a.png"), (BytesIO(body), filename)]})
+    assert response.status_code == status
+    assert temporary_files(root) == []
+
+
+def test_only_the_batch_route_takes_bodies_over_max_content_length(client):
+    client, root = client
+    images = lambda: {"images": [(BytesIO(PNG + b"\x00" * 900), f"{number}.png") for number in range(5)]}
+    assert client.post("/upload", content_type="multipart/form-data", data=images()).status_code == 413
+    assert client.post("/batch", content_type="multipart/form-data", data=images()).get_json() == {"files": 5}
+    assert temporary_files(root) == []
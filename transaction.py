@@ -1,5 +1,18 @@
 import os
+import hmac
+import hashlib
 from pypaystack.transactions import Transaction
 
 PAYSTACK_AUTHORIZATION_KEY = os.environ.get("PAYSTACK_AUTHORIZATION_KEY")
+PAYSTACK_SECRET_KEY = os.environ.get("PAYSTACK_SECRET_KEY") or PAYSTACK_AUTHORIZATION_KEY
 transaction = Transaction(authorization_key=PAYSTACK_AUTHORIZATION_KEY)
+
+
+def verify_signature(payload: bytes, signature: str) -> bool:
+    """
+    Paystack signs webhook bodies with HMAC-SHA512 of the secret key, sent in X-Paystack-Signature
+    """
+    if not PAYSTACK_SECRET_KEY or not signature:
+        return False
+    expected = hmac.new(PAYSTACK_SECRET_KEY.encode("utf-8"), payload, hashlib.sha512).hexdigest()
+    return hmac.compare_digest(expected, signature)